@@ -0,0 +1,210 @@
+import asyncio
+import itertools
+import math
+import time
+from collections import Counter
+
+from fastapi.responses import JSONResponse
+
+from app.core.config import settings
+
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+EXEMPT_PATHS = {"/", "/health", "/docs", "/redoc", "/openapi.json"}
+
+admission_metrics: Counter[str] = Counter()
+
+
+class TokenBucket:
+    """Seau à jetons : `rate` jetons par seconde, au plus `burst` d'avance"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def consume(self) -> float:
+        """Prend un jeton ; renvoie 0, ou le délai d'attente avant le prochain"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """
+    Un seau de lecture et un seau d'écriture par client.
+
+    Au plus `MAX_CLIENTS` seaux sont gardés, du moins au plus récemment
+    utilisé : une fois plein, les seaux revenus à plein sont oubliés, puis les
+    plus anciens jusqu'à ne garder que `PRUNE_TO` seaux.
+    """
+
+    MAX_CLIENTS = 10_000
+    PRUNE_TO = 9_000
+
+    def __init__(self) -> None:
+        self._buckets: dict[tuple[str, bool], TokenBucket] = {}
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def consume(self, client: str, is_write: bool) -> float:
+        # Retiré puis remis : l'ordre du dict suit le dernier usage
+        bucket = self._buckets.pop((client, is_write), None)
+        if bucket is None:
+            if len(self._buckets) >= self.MAX_CLIENTS:
+                self._prune()
+            if is_write:
+                bucket = TokenBucket(
+                    settings.WRITE_RATE_PER_SECOND, settings.WRITE_BURST
+                )
+            else:
+                bucket = TokenBucket(settings.READ_RATE_PER_SECOND, settings.READ_BURST)
+        self._buckets[(client, is_write)] = bucket
+        return bucket.consume()
+
+    def _prune(self) -> None:
+        """Oublie les clients dont le seau serait plein, puis les plus anciens"""
+        now = time.monotonic()
+        self._buckets = {
+            key: bucket
+            for key, bucket in self._buckets.items()
+            if bucket.tokens + (now - bucket.updated) * bucket.rate < bucket.burst
+        }
+        excess = len(self._buckets) - self.PRUNE_TO
+        if excess > 0:
+            admission_metrics["buckets_evicted"] += excess
+            for key in list(itertools.islice(self._buckets, excess)):
+                del self._buckets[key]
+
+
+class WriteGate:
+    """
+    Limite le nombre d'écritures simultanées devant l'unique écrivain SQLite.
+
+    Au-delà de `limit`, au plus `queue_size` requêtes attendent, chacune au plus
+    `timeout` secondes ; les autres sont refusées immédiatement.
+    """
+
+    def __init__(self, limit: int, queue_size: int, timeout: float) -> None:
+        self._semaphore = asyncio.Semaphore(limit)
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.waiting = 0
+        self.in_flight = 0
+
+    async def acquire(self) -> bool:
+        if self._semaphore.locked() and self.waiting >= self.queue_size:
+            return False
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._semaphore.release()
+
+
+rate_limiter = RateLimiter()
+# Avec le commit groupé, l'écrivain unique sérialise déjà les écritures : la
+# porte laisse passer un lot complet au lieu de brider la taille des lots
+write_gate = WriteGate(
+    (
+        settings.WRITE_BATCH_MAX_SIZE
+        if settings.WRITE_BATCHING_ENABLED
+        else settings.WRITE_CONCURRENCY
+    ),
+    settings.WRITE_QUEUE_SIZE,
+    settings.WRITE_QUEUE_TIMEOUT_SECONDS,
+)
+
+
+def client_key(scope) -> str:
+    """
+    Clé API (`X-API-Key`) si elle figure dans `RATE_LIMIT_API_KEYS`, sinon
+    adresse IP du client : une clé inconnue ne donne pas de seau neuf.
+    """
+    if settings.RATE_LIMIT_API_KEYS:
+        for name, value in scope["headers"]:
+            if name == b"x-api-key":
+                key = value.decode("latin-1")
+                if key in settings.RATE_LIMIT_API_KEYS:
+                    return "key:" + key
+                break
+    client = scope.get("client")
+    return "ip:" + (client[0] if client else "inconnu")
+
+
+def rejection(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content={"detail": detail},
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class AdmissionMiddleware:
+    """Limitation de débit par client et contrôle d'admission des écritures"""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if (
+            scope["type"] != "http"
+            or not settings.ADMISSION_ENABLED
+            or scope["path"] in EXEMPT_PATHS
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        is_write = scope["method"] not in READ_METHODS
+        kind = "write" if is_write else "read"
+        wait = rate_limiter.consume(client_key(scope), is_write)
+        if wait:
+            admission_metrics[f"{kind}_rate_limited"] += 1
+            response = rejection(429, "Trop de requêtes, réessayez plus tard", wait)
+            await response(scope, receive, send)
+            return
+
+        if not is_write:
+            admission_metrics["read_admitted"] += 1
+            await self.app(scope, receive, send)
+            return
+
+        if not await write_gate.acquire():
+            admission_metrics["write_shed"] += 1
+            response = rejection(
+                503,
+                "Serveur saturé en écriture, réessayez plus tard",
+                write_gate.timeout,
+            )
+            await response(scope, receive, send)
+            return
+
+        admission_metrics["write_admitted"] += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            write_gate.release()
+
+
+def admission_snapshot() -> dict[str, int]:
+    return {
+        **admission_metrics,
+        "write_in_flight": write_gate.in_flight,
+        "write_waiting": write_gate.waiting,
+        "tracked_buckets": len(rate_limiter),
+    }
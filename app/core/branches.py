@@ -0,0 +1,50 @@
+import re
+
+from app.core.config import settings
+from app.core.database import branch_engines, request_engine
+from app.core.negotiation import NegotiatedResponse
+
+BRANCH_HEADER = b"x-branch"
+BRANCH_PREFIX = re.compile(r"^/branches/([^/]+)(?=/|$)")
+
+
+class BranchMiddleware:
+    """
+    Choisit la base de la succursale visée : préfixe `/branches/{id}/...` ou
+    en-tête `X-Branch`, sinon base principale (`DEFAULT_BRANCH`).
+
+    Le préfixe passe dans `root_path` : les routes restent celles de l'API
+    sans succursale.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not branch_engines:
+            await self.app(scope, receive, send)
+            return
+
+        root_path = scope.get("root_path", "")
+        prefix = BRANCH_PREFIX.match(scope["path"][len(root_path) :])
+        if prefix:
+            branch = prefix.group(1)
+            scope = {**scope, "root_path": root_path + prefix.group(0)}
+        else:
+            branch = dict(scope["headers"]).get(BRANCH_HEADER, b"").decode("latin-1")
+
+        if not branch or branch == settings.DEFAULT_BRANCH:
+            await self.app(scope, receive, send)
+            return
+        if branch not in branch_engines:
+            response = NegotiatedResponse(
+                status_code=404, content={"detail": f"Succursale inconnue : {branch}"}
+            )
+            await response(scope, receive, send)
+            return
+
+        token = request_engine.set(branch_engines[branch])
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_engine.reset(token)
@@ -0,0 +1,355 @@
+import threading
+from array import array
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from app.core.changefeed import TRACKED_ENTITIES, changes_after, latest_change_id
+from app.core.database import engine
+from app.models.book import Book, BookCategory
+
+try:
+    import numpy
+except ImportError:  # dépendance optionnelle : filtres en Python pur sans elle
+    numpy = None
+
+CATEGORY_CODES = {category: code for code, category in enumerate(BookCategory)}
+
+SNAPSHOT_COLUMNS = (
+    Book.id,
+    Book.publication_year,
+    Book.category,
+    Book.language,
+    Book.available_copies,
+    Book.author_id,
+)
+
+
+class CatalogFilter(NamedTuple):
+    year_min: Optional[int] = None
+    year_max: Optional[int] = None
+    category_code: Optional[int] = None
+    language_code: Optional[int] = None
+    available_only: bool = False
+    author_id: Optional[int] = None
+
+
+class BookCatalog:
+    """
+    Copie en colonnes des champs de `books` sur lesquels portent les filtres.
+
+    Une colonne par champ (module `array`, lue sans copie par NumPy quand il est
+    installé) : un filtre est un masque calculé sur toute la colonne, puis
+    seuls les identifiants de la page demandée en sont extraits et chargés
+    depuis la base. Langues et catégories sont codées en entiers ; un livre
+    supprimé est seulement marqué mort pour ne pas décaler les positions.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.loaded = False
+        # Dernière entrée du journal des modifications déjà appliquée
+        self.change_cursor = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        self.ids = array("q")
+        self.years = array("h")
+        self.categories = array("B")
+        self.languages = array("H")
+        self.available = array("i")
+        self.authors = array("q")
+        self.live = array("B")
+        self._positions: dict[int, int] = {}
+        self._language_codes: dict[str, int] = {}
+        self._removed = 0
+        self._unordered = False
+        # Incrémentée quand les positions changent (remise en ordre des ids)
+        self.generation = 0
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def load(self, rows: Iterable[tuple]) -> None:
+        with self._lock:
+            self._reset()
+            for row in rows:
+                self._put(*row)
+            self.loaded = True
+
+    def upsert(self, rows: Iterable[tuple]) -> None:
+        with self._lock:
+            for row in rows:
+                self._put(*row)
+
+    def remove(self, book_ids: Iterable[int]) -> None:
+        with self._lock:
+            for book_id in book_ids:
+                position = self._positions.pop(book_id, None)
+                if position is not None:
+                    self.live[position] = 0
+                    self._removed += 1
+
+    def _put(
+        self,
+        book_id: int,
+        year: int,
+        category: BookCategory,
+        language: str,
+        available: int,
+        author_id: int,
+    ) -> None:
+        language = language.lower()
+        language_code = self._language_codes.setdefault(
+            language, len(self._language_codes)
+        )
+        category_code = CATEGORY_CODES[BookCategory(category)]
+
+        position = self._positions.get(book_id)
+        if position is None:
+            if self.ids and book_id < self.ids[-1]:
+                self._unordered = True
+            self._positions[book_id] = len(self.ids)
+            self.ids.append(book_id)
+            self.years.append(year)
+            self.categories.append(category_code)
+            self.languages.append(language_code)
+            self.available.append(available)
+            self.authors.append(author_id)
+            self.live.append(1)
+        else:
+            self.years[position] = year
+            self.categories[position] = category_code
+            self.languages[position] = language_code
+            self.available[position] = available
+            self.authors[position] = author_id
+
+    def _reorder(self) -> None:
+        """Remet les livres vivants par id croissant (id réutilisé, cas rare)"""
+        columns = (
+            self.ids,
+            self.years,
+            self.categories,
+            self.languages,
+            self.available,
+            self.authors,
+        )
+        rows = sorted(
+            (row for row in zip(*columns, self.live) if row[-1]),
+            key=lambda row: row[0],
+        )
+        for column in (*columns, self.live):
+            del column[:]
+        for row in rows:
+            for column, value in zip((*columns, self.live), row):
+                column.append(value)
+        self._positions = {
+            book_id: position for position, book_id in enumerate(self.ids)
+        }
+        self._removed = 0
+        self._unordered = False
+        self.generation += 1
+
+    def match(
+        self,
+        year_min: Optional[int] = None,
+        year_max: Optional[int] = None,
+        category: Optional[BookCategory] = None,
+        language: Optional[str] = None,
+        available_only: bool = False,
+        author_id: Optional[int] = None,
+    ) -> "CatalogMatch":
+        """Livres qui passent tous les filtres, par id croissant"""
+        with self._lock:
+            language_code = None
+            if language is not None:
+                language_code = self._language_codes.get(language.lower())
+                if language_code is None:
+                    return CatalogMatch(self, None, [])
+            filters = CatalogFilter(
+                year_min,
+                year_max,
+                CATEGORY_CODES[category] if category else None,
+                language_code,
+                available_only,
+                author_id,
+            )
+            return CatalogMatch(self, filters, self._select(filters))
+
+    def _select(self, filters: CatalogFilter):
+        """Masque NumPy des positions retenues, ou liste des ids sans NumPy"""
+        if self._unordered:
+            self._reorder()
+        if numpy is None:
+            return self._select_python(filters)
+
+        def column(values: array):
+            return numpy.frombuffer(values, dtype=values.typecode)
+
+        year_min, year_max = filters.year_min, filters.year_max
+        conditions = []
+        if year_min is not None and year_min == year_max:
+            conditions.append(lambda: column(self.years) == year_min)
+        else:
+            if year_min is not None:
+                conditions.append(lambda: column(self.years) >= year_min)
+            if year_max is not None:
+                conditions.append(lambda: column(self.years) <= year_max)
+        if filters.category_code is not None:
+            conditions.append(lambda: column(self.categories) == filters.category_code)
+        if filters.language_code is not None:
+            conditions.append(lambda: column(self.languages) == filters.language_code)
+        if filters.available_only:
+            conditions.append(lambda: column(self.available) > 0)
+        if filters.author_id is not None:
+            conditions.append(lambda: column(self.authors) == filters.author_id)
+        if self._removed or not conditions:
+            conditions.append(lambda: column(self.live).astype(bool))
+
+        # Chaque comparaison produit un tableau neuf : aucune vue ne sort du verrou
+        mask = conditions[0]()
+        for condition in conditions[1:]:
+            mask &= condition()
+        return mask
+
+    def _select_python(self, filters: CatalogFilter) -> list[int]:
+        year_min, year_max, category_code, language_code, available_only, author = (
+            filters
+        )
+        return [
+            book_id
+            for book_id, live, year, category, language, available, author_id in zip(
+                self.ids,
+                self.live,
+                self.years,
+                self.categories,
+                self.languages,
+                self.available,
+                self.authors,
+            )
+            if live
+            and (year_min is None or year >= year_min)
+            and (year_max is None or year <= year_max)
+            and (category_code is None or category == category_code)
+            and (language_code is None or language == language_code)
+            and (not available_only or available > 0)
+            and (author is None or author_id == author)
+        ]
+
+    def ids_at(self, positions) -> list[int]:
+        return [self.ids[position] for position in positions.tolist()]
+
+
+class CatalogMatch:
+    """
+    Résultat d'un filtre : le total est un simple comptage du masque, et seuls
+    les identifiants d'une page (ou d'un lot, pour un flux) sont extraits.
+    """
+
+    BLOCK = 1 << 16
+
+    def __init__(self, catalog: BookCatalog, filters, selection) -> None:
+        self._catalog = catalog
+        self._filters = filters
+        self._selection = selection
+        self._generation = catalog.generation
+        if isinstance(selection, list):
+            self._total = len(selection)
+        else:
+            self._total = int(numpy.count_nonzero(selection))
+
+    def __len__(self) -> int:
+        return self._total
+
+    def page(self, start: int, stop: int) -> list[int]:
+        if isinstance(self._selection, list):
+            return self._selection[start:stop]
+
+        with self._catalog._lock:
+            if self._generation != self._catalog.generation:
+                self._selection = self._catalog._select(self._filters)
+                self._generation = self._catalog.generation
+            book_ids: list[int] = []
+            seen = 0
+            mask = self._selection
+            for offset in range(0, len(mask), self.BLOCK):
+                if seen >= stop:
+                    break
+                block = mask[offset : offset + self.BLOCK]
+                hits = int(numpy.count_nonzero(block))
+                if seen + hits > start:
+                    positions = numpy.flatnonzero(block) + offset
+                    wanted = positions[max(0, start - seen) : stop - seen]
+                    book_ids.extend(self._catalog.ids_at(wanted))
+                seen += hits
+            return book_ids
+
+    def chunks(self, size: int) -> Iterator[list[int]]:
+        for start in range(0, self._total, size):
+            yield self.page(start, start + size)
+
+
+catalog = BookCatalog()
+
+
+def build_catalog(session: Session) -> None:
+    # Curseur lu avant les livres : une écriture entre les deux est relue
+    # deux fois au pire, jamais perdue
+    cursor = latest_change_id(session)
+    catalog.load(session.exec(select(*SNAPSHOT_COLUMNS)))
+    catalog.change_cursor = cursor
+
+
+def sync_catalog() -> None:
+    """
+    Applique les écritures de livres faites par les autres workers, lues dans
+    le journal des modifications : chaque worker a au plus
+    `CATALOG_SYNC_SECONDS` de retard. Si le journal a été purgé au-delà du
+    curseur, le catalogue est reconstruit.
+    """
+    if not catalog.loaded:
+        return
+    with Session(engine) as session:
+        found = changes_after(session, catalog.change_cursor, (TRACKED_ENTITIES[Book],))
+        if found is None:
+            build_catalog(session)
+            return
+    changes, cursor = found
+    if changes:
+        refresh_catalog({change.entity_id for change in changes})
+    catalog.change_cursor = cursor
+
+
+def refresh_catalog(book_ids: set[int]) -> None:
+    """Relit en base les livres modifiés (exemplaires disponibles compris)"""
+    with engine.connect() as connection:
+        rows = connection.execute(
+            select(*SNAPSHOT_COLUMNS).where(Book.id.in_(book_ids))
+        ).all()
+    catalog.upsert(rows)
+    catalog.remove(book_ids - {row[0] for row in rows})
+
+
+@event.listens_for(Session, "after_flush")
+def track_book_writes(session: Session, flush_context) -> None:
+    # Le catalogue en mémoire est celui de la base principale
+    if not catalog.loaded or session.bind is not engine:
+        return
+    touched = session.info.setdefault("catalog_books", set())
+    for instances in (session.new, session.dirty, session.deleted):
+        touched.update(
+            instance.id for instance in instances if isinstance(instance, Book)
+        )
+
+
+@event.listens_for(Session, "after_commit")
+def apply_book_writes(session: Session) -> None:
+    """
+    Après commit seulement, en relisant la base : un SAVEPOINT annulé au milieu
+    d'un lot laisse au pire un livre relu pour rien. Les écritures des autres
+    workers arrivent par `sync_catalog`.
+    """
+    touched = session.info.pop("catalog_books", None)
+    if touched:
+        refresh_catalog(touched)
@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, event, insert, text
+from sqlmodel import Session, func, select
+
+from app.core.config import settings
+from app.core.database import write_engines
+from app.models.author import Author
+from app.models.book import Book
+from app.models.change import Change
+from app.models.loan import Loan
+
+TRACKED_ENTITIES = {Book: "book", Author: "author", Loan: "loan"}
+
+
+@event.listens_for(Session, "after_flush")
+def record_changes(session: Session, flush_context) -> None:
+    """
+    Journalise les écritures sur les entités suivies dans la même transaction.
+
+    Branché sur le flush de l'ORM : toutes les routes d'écriture sont couvertes
+    sans appel explicite, et une suppression laisse une pierre tombale.
+    """
+    now = datetime.now()
+    rows = []
+    for operation, instances in (
+        ("create", session.new),
+        ("update", session.dirty),
+        ("delete", session.deleted),
+    ):
+        for instance in instances:
+            entity = TRACKED_ENTITIES.get(type(instance))
+            if entity is None:
+                continue
+            if operation == "update" and not session.is_modified(instance):
+                continue
+            rows.append(
+                {
+                    "entity": entity,
+                    "entity_id": instance.id,
+                    "operation": operation,
+                    "changed_at": now,
+                    "payload": (
+                        None
+                        if operation == "delete"
+                        else instance.model_dump(mode="json")
+                    ),
+                }
+            )
+    if rows:
+        session.connection().execute(insert(Change), rows)
+
+
+def record_bulk_deletes(session: Session, model: type, entity_ids: list[int]) -> None:
+    """
+    Pierres tombales pour une suppression en masse (`delete()` hors ORM), que
+    `record_changes` ne voit pas passer ; à appeler dans la même transaction.
+    """
+    now = datetime.now()
+    session.connection().execute(
+        insert(Change),
+        [
+            {
+                "entity": TRACKED_ENTITIES[model],
+                "entity_id": entity_id,
+                "operation": "delete",
+                "changed_at": now,
+                "payload": None,
+            }
+            for entity_id in entity_ids
+        ],
+    )
+
+
+def pruned_through(session: Session) -> int:
+    """
+    Plus grand id purgé du journal : un jeton plus petit a manqué des entrées.
+
+    Journal vidé par la purge : c'est le dernier id attribué, que SQLite garde
+    dans `sqlite_sequence` (table en AUTOINCREMENT).
+    """
+    oldest = session.exec(select(func.min(Change.id))).one()
+    if oldest is not None:
+        return oldest - 1
+    last_id = session.execute(
+        text("SELECT seq FROM sqlite_sequence WHERE name = :table"),
+        {"table": Change.__tablename__},
+    ).scalar()
+    return last_id or 0
+
+
+def latest_change_id(session: Session) -> int:
+    """Dernier id du journal, même vidé par la purge"""
+    return session.exec(select(func.max(Change.id))).one() or pruned_through(session)
+
+
+def changes_after(
+    session: Session, cursor: int, entities: tuple[str, ...]
+) -> Optional[tuple[list[Change], int]]:
+    """
+    Entrées de `entities` postérieures à `cursor`, dans l'ordre, et le nouveau
+    curseur ; None si le journal a été purgé au-delà de `cursor` (l'état en
+    mémoire qui le suit doit alors être reconstruit).
+    """
+    if cursor < pruned_through(session):
+        return None
+    latest = latest_change_id(session)
+    if latest <= cursor:
+        return [], cursor
+    changes = session.exec(
+        select(Change)
+        .where(Change.id > cursor, Change.id <= latest, Change.entity.in_(entities))
+        .order_by(Change.id)
+    ).all()
+    return list(changes), latest
+
+
+def prune_changes(session: Session) -> int:
+    """Supprime les entrées plus vieilles que `CHANGES_RETENTION_DAYS`"""
+    cutoff = datetime.now() - timedelta(days=settings.CHANGES_RETENTION_DAYS)
+    result = session.execute(delete(Change).where(Change.changed_at < cutoff))
+    session.commit()
+    return result.rowcount
+
+
+def run_prune_changes_job() -> int:
+    pruned = 0
+    for bind in write_engines().values():
+        with Session(bind) as session:
+            pruned += prune_changes(session)
+    return pruned
@@ -0,0 +1,153 @@
+import asyncio
+import time
+from collections import Counter
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode
+
+from app.core.branches import BRANCH_PREFIX
+from app.core.config import settings
+
+# En-têtes qui changent la représentation renvoyée pour une même URL
+# (la compression est appliquée plus haut, sur la réponse partagée)
+VARY_HEADERS = (b"accept", b"x-branch")
+
+coalescing_metrics: Counter[str] = Counter()
+
+Messages = list[dict]
+
+
+def request_key(scope) -> tuple:
+    """Route, paramètres normalisés et en-têtes de négociation de la requête"""
+    params = parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True)
+    # Tri stable : l'ordre des valeurs répétées (`ids=2&ids=1`) est conservé
+    query = urlencode(sorted(params, key=lambda param: param[0]))
+    headers = dict(scope["headers"])
+    return (
+        scope["path"],
+        query,
+        *(headers.get(name, b"") for name in VARY_HEADERS),
+    )
+
+
+class CoalescingMiddleware:
+    """
+    Single-flight des lectures : des GET identiques et simultanés partagent une
+    seule exécution de la route et sa réponse sérialisée.
+
+    La première requête (leader) exécute la route ; celles qui arrivent pendant
+    ce temps attendent sa réponse au lieu de refaire les mêmes requêtes SQL.
+    Avec `COALESCE_CACHE_SECONDS`, une réponse 200 reste servie pendant ce court
+    délai après la fin du leader. Seules les réponses envoyées d'un bloc sont
+    partagées : dès qu'un corps arrive en plusieurs morceaux (réponse en flux),
+    le leader cesse de le garder en mémoire et les suiveurs exécutent leur
+    propre requête.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+        self._in_flight: dict[tuple, asyncio.Future] = {}
+        self._cache: dict[tuple, tuple[float, Messages]] = {}
+
+    def _coalesces(self, scope) -> bool:
+        return (
+            scope["type"] == "http"
+            and settings.COALESCING_ENABLED
+            and scope["method"] == "GET"
+            # Préfixe de succursale (`/branches/{id}`) ignoré : la clé garde le
+            # chemin complet, les succursales ne partagent donc rien
+            and BRANCH_PREFIX.sub("", scope["path"], count=1).startswith(
+                tuple(settings.COALESCE_PATH_PREFIXES)
+            )
+        )
+
+    async def __call__(self, scope, receive, send) -> None:
+        if not self._coalesces(scope):
+            await self.app(scope, receive, send)
+            return
+
+        key = request_key(scope)
+        cached = self._cached(key)
+        if cached is not None:
+            coalescing_metrics["cache_hits"] += 1
+            await replay(cached, send)
+            return
+
+        leader = self._in_flight.get(key)
+        if leader is not None:
+            messages = await asyncio.shield(leader)
+            if messages is not None:
+                coalescing_metrics["followers"] += 1
+                await replay(messages, send)
+                return
+            # Le leader a échoué ou répond en flux : chacun exécute sa requête
+            await self.app(scope, receive, send)
+            return
+
+        coalescing_metrics["leaders"] += 1
+        await self._lead(key, scope, receive, send)
+
+    async def _lead(self, key: tuple, scope, receive, send) -> None:
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        messages: Optional[Messages] = []
+
+        def release(shared: Optional[Messages]) -> None:
+            if not future.done():
+                future.set_result(shared)
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+        async def capture(message: dict) -> None:
+            nonlocal messages
+            if messages is not None:
+                if message["type"] == "http.response.body" and message.get(
+                    "more_body", False
+                ):
+                    # Corps en flux : rien n'est gardé, la mémoire reste bornée
+                    coalescing_metrics["streamed"] += 1
+                    messages = None
+                    release(None)
+                else:
+                    messages.append(message)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture)
+        except BaseException:
+            release(None)
+            raise
+        release(messages)
+
+        cacheable = messages and messages[0].get("status") == 200
+        if settings.COALESCE_CACHE_SECONDS and cacheable:
+            self._store(key, messages)
+
+    def _cached(self, key: tuple) -> Optional[Messages]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, messages = entry
+        if expires_at < time.monotonic():
+            del self._cache[key]
+            return None
+        return messages
+
+    def _store(self, key: tuple, messages: Messages) -> None:
+        now = time.monotonic()
+        if len(self._cache) >= settings.COALESCE_CACHE_MAX_ENTRIES:
+            self._cache = {
+                cached_key: entry
+                for cached_key, entry in self._cache.items()
+                if entry[0] >= now
+            }
+        if len(self._cache) < settings.COALESCE_CACHE_MAX_ENTRIES:
+            self._cache[key] = (now + settings.COALESCE_CACHE_SECONDS, messages)
+
+
+async def replay(messages: Messages, send) -> None:
+    for message in messages:
+        await send(message)
+
+
+def coalescing_snapshot() -> dict[str, int]:
+    return dict(coalescing_metrics)
@@ -0,0 +1,123 @@
+import zlib
+from typing import Optional
+
+from app.core.config import settings
+
+try:
+    import brotli
+except ImportError:  # dépendance optionnelle : gzip seul sans elle
+    brotli = None
+
+# Le flux SSE doit partir événement par événement, sans tampon de compression
+UNCOMPRESSED_TYPES = (b"text/event-stream",)
+
+
+class Compressor:
+    """Interface commune à zlib (gzip) et brotli : compress() puis finish()"""
+
+    def __init__(self, encoding: str) -> None:
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=settings.COMPRESSION_LEVEL)
+        else:
+            self._zlib = zlib.compressobj(settings.COMPRESSION_LEVEL, wbits=31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data)
+        return self._zlib.compress(data)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+
+def negotiate(headers: list[tuple[bytes, bytes]]) -> Optional[str]:
+    """Encodage choisi d'après Accept-Encoding : brotli si possible, sinon gzip"""
+    accepted = set()
+    for name, value in headers:
+        if name == b"accept-encoding":
+            for token in value.decode("latin-1").split(","):
+                coding, _, params = token.strip().partition(";")
+                if params.replace(" ", "") not in ("q=0", "q=0.0"):
+                    accepted.add(coding.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+class CompressionMiddleware:
+    """
+    Compression gzip/brotli négociée des réponses d'au moins
+    `COMPRESSION_MIN_BYTES`.
+
+    Les réponses en flux sont compressées morceau par morceau : la mémoire reste
+    bornée, et le seuil ne s'applique qu'aux réponses envoyées d'un seul bloc.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        encoding = None
+        if scope["type"] == "http" and settings.COMPRESSION_ENABLED:
+            encoding = negotiate(scope["headers"])
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: dict = {}
+        compressor: Optional[Compressor] = None
+        passthrough = False
+
+        async def compressing_send(message: dict) -> None:
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                # Les en-têtes d'un flux SSE partent sans attendre le premier événement
+                passthrough = not compressible_type(start)
+                if passthrough:
+                    await send(start)
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                body = message.get("body", b"")
+                if not more_body and len(body) < settings.COMPRESSION_MIN_BYTES:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = Compressor(encoding)
+                await send({**start, "headers": compressed_headers(start, encoding)})
+            data = compressor.compress(message.get("body", b""))
+            if not more_body:
+                data += compressor.finish()
+            elif not data:
+                return
+            await send(
+                {"type": "http.response.body", "body": data, "more_body": more_body}
+            )
+
+        await self.app(scope, receive, compressing_send)
+
+
+def compressible_type(start: dict) -> bool:
+    headers = dict(start["headers"])
+    if b"content-encoding" in headers:
+        return False
+    return not headers.get(b"content-type", b"").startswith(UNCOMPRESSED_TYPES)
+
+
+def compressed_headers(start: dict, encoding: str) -> list[tuple[bytes, bytes]]:
+    headers = [
+        (name, value) for name, value in start["headers"] if name != b"content-length"
+    ]
+    headers.append((b"content-encoding", encoding.encode()))
+    headers.append((b"vary", b"Accept-Encoding"))
+    return headers
@@ -1,11 +1,21 @@
+from typing import Literal, Optional
+
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
 
     DATABASE_URL: str = "sqlite:///./database.db"
+    # Succursales : identifiant -> base propre ; auteurs communs dans DATABASE_URL
+    BRANCHES: dict[str, str] = {}
+    DEFAULT_BRANCH: str = "main"
+    # "create" : create_all au démarrage, "verify" : contrôle de version sans DDL
+    SCHEMA_MODE: Literal["create", "verify"] = "create"
 
     MAX_LOANS_PER_USER: int = 5
+    # Réservations non servables examinées au plus par retour avant de rendre
+    # l'exemplaire disponible
+    HOLD_MAX_SKIPS: int = 20
     LOAN_DURATION_DAYS: int = 1
     PENALTY_RATE_PER_DAY: float = 0.50
     MAX_PENALTY: float = 50.0
@@ -13,6 +23,93 @@ class Settings(BaseSettings):
     DEFAULT_PAGE_SIZE: int = 20
     MAX_PAGE_SIZE: int = 100
 
+    # Archivage des emprunts retournés (0 = tâche périodique désactivée)
+    ARCHIVE_AFTER_DAYS: int = 90
+    ARCHIVE_BATCH_SIZE: int = 500
+    ARCHIVE_INTERVAL_SECONDS: int = 0
+
+    # Part minimale des trigrammes de la requête retrouvés dans un nom
+    FUZZY_MIN_SIMILARITY: float = 0.5
+    # Écritures des autres workers reportées dans les index de recherche
+    SEARCH_INDEX_SYNC_SECONDS: int = 1
+
+    # Index « aussi empruntés » (0 = élagage périodique désactivé)
+    RELATED_KEEP_PER_BOOK: int = 50
+    RELATED_PRUNE_INTERVAL_SECONDS: int = 0
+
+    # Flux d'événements (SSE)
+    EVENTS_QUEUE_SIZE: int = 100
+    EVENTS_KEEPALIVE_SECONDS: int = 15
+
+    # Journal des modifications (/changes)
+    CHANGES_RETENTION_DAYS: int = 30
+    CHANGES_PRUNE_INTERVAL_SECONDS: int = 3600
+
+    # En-tête Idempotency-Key sur la création et le retour d'emprunts
+    IDEMPOTENCY_TTL_HOURS: int = 24
+    IDEMPOTENCY_PURGE_BATCH_SIZE: int = 1000
+    IDEMPOTENCY_PURGE_INTERVAL_SECONDS: int = 600
+
+    # Limitation de débit par client et admission des écritures
+    ADMISSION_ENABLED: bool = True
+    READ_RATE_PER_SECOND: float = 50.0
+    READ_BURST: int = 100
+    WRITE_RATE_PER_SECOND: float = 10.0
+    WRITE_BURST: int = 20
+    # Clés `X-API-Key` reconnues, chacune avec ses propres seaux (sinon par IP)
+    RATE_LIMIT_API_KEYS: list[str] = []
+    WRITE_CONCURRENCY: int = 4
+    WRITE_QUEUE_SIZE: int = 32
+    WRITE_QUEUE_TIMEOUT_SECONDS: float = 2.0
+
+    # Commit groupé des écritures par un écrivain unique
+    WRITE_BATCHING_ENABLED: bool = False
+    WRITE_BATCH_WINDOW_MS: float = 2.0
+    WRITE_BATCH_MAX_SIZE: int = 64
+
+    # Reprise des écritures sur base occupée (SQLITE_BUSY / SQLITE_LOCKED)
+    WRITE_RETRY_DEADLINE_SECONDS: float = 10.0
+    WRITE_RETRY_BASE_DELAY_MS: float = 10.0
+    WRITE_RETRY_MAX_DELAY_MS: float = 500.0
+
+    # Lectures identiques simultanées exécutées une seule fois (single-flight)
+    COALESCING_ENABLED: bool = True
+    COALESCE_PATH_PREFIXES: list[str] = ["/books", "/authors", "/autocomplete"]
+    COALESCE_CACHE_SECONDS: float = 0.0
+    COALESCE_CACHE_MAX_ENTRIES: int = 1000
+
+    # Compression gzip/brotli négociée et listes JSON envoyées en flux
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_BYTES: int = 1024
+    COMPRESSION_LEVEL: int = 5
+    STREAM_CHUNK_BYTES: int = 64 * 1024
+    STREAM_YIELD_PER: int = 500
+
+    # Copie en colonnes du catalogue pour les filtres année/catégorie/langue
+    CATALOG_SNAPSHOT_ENABLED: bool = False
+    # Écritures des autres workers relues dans le journal des modifications
+    CATALOG_SYNC_SECONDS: int = 1
+
+    # Copie en lecture seule pour les rapports (None = rapports sur la base)
+    REPORTING_DATABASE_PATH: Optional[str] = None
+    REPORTING_REFRESH_SECONDS: int = 300
+    REPORTING_BACKUP_PAGES: int = 1024
+    REPORTING_BACKUP_SLEEP_MS: float = 5.0
+
+    # Maintenance de la base (0 = désactivée), fenêtres en heure locale
+    MAINTENANCE_CHECK_SECONDS: int = 0
+    MAINTENANCE_WINDOWS: list[str] = ["02:00-05:00"]
+    MAINTENANCE_ANALYSIS_LIMIT: int = 1000
+    MAINTENANCE_VACUUM_PAGES: int = 2000
+
+    # Logs JSON écrits par un thread dédié, erreurs répétées échantillonnées
+    LOG_LEVEL: str = "INFO"
+    LOG_JSON: bool = True
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_SAMPLING_BURST: int = 10
+    LOG_SAMPLING_RATE: int = 100
+    LOG_SAMPLING_WINDOW_SECONDS: float = 60.0
+
     class Config:
         env_file = ".env"
 
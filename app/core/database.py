@@ -1,21 +1,146 @@
-from typing import Annotated
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Annotated, Iterator, Optional
 
 from fastapi import Depends
+from sqlalchemy import Engine, event
 from sqlmodel import Session, SQLModel, create_engine
 
 from app.core.config import settings
 
+# À incrémenter à chaque ajout ou modification de table
+SCHEMA_VERSION = 6
+
 connect_args = {"check_same_thread": False}
 engine = create_engine(settings.DATABASE_URL, connect_args=connect_args)
 
+# Tables de référence communes, gardées dans la base principale : chaque base
+# de succursale l'attache sous ce nom et les y retrouve sans préfixe
+SHARED_TABLES = ("authors",)
+SHARED_SCHEMA = "shared"
+
+
+def create_branch_engine(url: str) -> Engine:
+    branch_engine = create_engine(url, connect_args=connect_args)
+
+    @event.listens_for(branch_engine, "connect")
+    def attach_shared(dbapi_connection, connection_record) -> None:
+        dbapi_connection.execute(
+            f"ATTACH DATABASE ? AS {SHARED_SCHEMA}", (engine.url.database,)
+        )
+
+    return branch_engine
+
+
+# Une base (et donc un verrou d'écriture) par succursale de `BRANCHES`
+branch_engines: dict[str, Engine] = {
+    branch: create_branch_engine(url) for branch, url in settings.BRANCHES.items()
+}
+
+# Écritures des succursales sur des connexions sans la base commune : un
+# `BEGIN IMMEDIATE` verrouille chaque base attachée, une écriture de succursale
+# bloquerait sinon la base principale et toutes les autres succursales
+branch_writers: dict[Engine, Engine] = {
+    bind: create_engine(bind.url, connect_args=connect_args)
+    for bind in branch_engines.values()
+}
+
+# Base de la succursale visée par la requête en cours (None = base principale)
+request_engine: ContextVar[Optional[Engine]] = ContextVar(
+    "request_engine", default=None
+)
+
+
+def all_engines() -> list[Engine]:
+    """Base principale puis bases des succursales (lecture)"""
+    return [engine, *branch_engines.values()]
+
+
+def writer_for(bind: Engine) -> Engine:
+    """Moteur d'écriture de la base de `bind`, sans base commune attachée"""
+    return branch_writers.get(bind, bind)
+
+
+def write_engines() -> dict[str, Engine]:
+    """Moteurs d'écriture de la base principale puis des succursales, par nom"""
+    return {
+        settings.DEFAULT_BRANCH: engine,
+        **{branch: writer_for(bind) for branch, bind in branch_engines.items()},
+    }
+
+
+def on_primary_database() -> bool:
+    return request_engine.get() is None
+
+
+@contextmanager
+def shared_session(session: Session) -> Iterator[Session]:
+    """
+    Session où lire les tables communes (`SHARED_TABLES`) pendant une écriture :
+    `session` elle-même sur la base principale, sinon une session à part sur
+    la base principale (l'écriture d'une succursale ne l'attache pas).
+    """
+    if session.bind is engine:
+        yield session
+        return
+    with Session(engine) as primary:
+        yield primary
+
 
 def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+    branch_tables = [
+        table
+        for table in SQLModel.metadata.sorted_tables
+        if table.name not in SHARED_TABLES
+    ]
+    for bind in write_engines().values():
+        # Succursale : sans la base commune, dont les tables masqueraient
+        # celles à créer
+        create_tables(bind, None if bind is engine else branch_tables)
+
+
+def create_tables(bind: Engine, tables: Optional[list] = None) -> None:
+    with bind.connect() as connection:
+        # Sans effet sur une base existante : seules les nouvelles en profitent
+        connection.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+    SQLModel.metadata.create_all(bind, tables=tables)
+    with bind.begin() as connection:
+        connection.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def verify_schema() -> None:
+    """Vérifie la version du schéma sans émettre de DDL"""
+    for bind in write_engines().values():
+        with bind.connect() as connection:
+            version = connection.exec_driver_sql("PRAGMA main.user_version").scalar()
+        if version != SCHEMA_VERSION:
+            raise RuntimeError(
+                f"Version du schéma {version} trouvée dans {bind.url.database}, "
+                f"{SCHEMA_VERSION} attendue : "
+                "lancer `python -m app.core.database` avant de démarrer l'API"
+            )
 
 
 def get_session():
-    with Session(engine) as session:
+    with Session(request_engine.get() or engine) as session:
         yield session
 
 
 SessionDep = Annotated[Session, Depends(get_session)]
+
+
+def get_primary_session():
+    """Session sur la base principale quelle que soit la succursale visée"""
+    with Session(engine) as session:
+        yield session
+
+
+# Écritures des tables communes (auteurs), gardées dans la base principale
+PrimarySessionDep = Annotated[Session, Depends(get_primary_session)]
+
+
+if __name__ == "__main__":
+    import app.main  # noqa: F401  (enregistre toutes les tables)
+
+    create_db_and_tables()
+    print(f"Schéma créé (version {SCHEMA_VERSION})")
@@ -1,3 +1,5 @@
+import logging
+
 from fastapi import Request, status
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
@@ -12,6 +14,8 @@ from app.core.exceptions import (
     LoanNotFoundException,
 )
 
+logger = logging.getLogger(__name__)
+
 
 async def library_exception_handler(request: Request, exc: LibraryException):
     """Handler pour les exceptions métier de la bibliothèque"""
@@ -48,10 +52,16 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 
 async def generic_exception_handler(request: Request, exc: Exception):
     """Handler générique pour les erreurs non gérées"""
-    # En production, logger l'erreur
-    import traceback
-
-    traceback.print_exc()
+    # Appelé hors des middlewares : l'identifiant de requête vient de `state`
+    current = getattr(request.state, "request_id", None)
+    # Mis en file, écrit par le thread de logs : pas d'E/S sur la boucle
+    logger.error(
+        "Erreur non gérée sur %s %s",
+        request.method,
+        request.url.path,
+        exc_info=exc,
+        extra={"request_id": current},
+    )
 
     return JSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -59,4 +69,5 @@ async def generic_exception_handler(request: Request, exc: Exception):
             "detail": "Une erreur interne s'est produite",
             "error": str(exc) if request.app.debug else None,
         },
+        headers={"X-Request-ID": current} if current else None,
     )
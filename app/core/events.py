@@ -0,0 +1,124 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Optional
+
+from app.core.config import settings
+from app.models.book import Book
+from app.models.loan import Loan
+
+Event = dict[str, Any]
+
+
+class Subscription:
+    """File d'événements d'un abonné, avec ses filtres éventuels"""
+
+    def __init__(
+        self, book_id: Optional[int], library_card_number: Optional[str]
+    ) -> None:
+        self.book_id = book_id
+        self.library_card_number = library_card_number
+        # compartiment du broker : par livre, sinon par carte, sinon global
+        if book_id is not None:
+            self.key: tuple[str, Any] = ("book", book_id)
+        elif library_card_number is not None:
+            self.key = ("card", library_card_number)
+        else:
+            self.key = ("all", None)
+        self.queue: asyncio.Queue[Event] = asyncio.Queue(
+            maxsize=settings.EVENTS_QUEUE_SIZE
+        )
+
+    def push(self, event: Event) -> None:
+        """Ajoute un événement ; si l'abonné est trop lent, le plus ancien saute"""
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+
+class EventBroker:
+    """
+    Diffusion en processus des événements d'emprunt et de disponibilité.
+
+    Les abonnés sont rangés par livre, par carte de lecteur ou sans filtre :
+    une publication ne touche que les abonnés concernés, et un abonné inactif
+    ne coûte qu'une file vide. `publish` peut être appelé depuis les threads
+    des routes synchrones ; la distribution se fait dans la boucle asyncio.
+    """
+
+    def __init__(self) -> None:
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribers: dict[tuple[str, Any], set[Subscription]] = defaultdict(set)
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    def subscribe(
+        self, book_id: Optional[int] = None, library_card_number: Optional[str] = None
+    ) -> Subscription:
+        subscription = Subscription(book_id, library_card_number)
+        self._subscribers[subscription.key].add(subscription)
+        self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        bucket = self._subscribers.get(subscription.key)
+        if bucket is None or subscription not in bucket:
+            return
+        bucket.discard(subscription)
+        if not bucket:
+            del self._subscribers[subscription.key]
+        self._count -= 1
+
+    def publish(self, event: Event) -> None:
+        """Publie un événement (sans effet si personne n'écoute)"""
+        if self._loop is None or self._count == 0:
+            return
+        self._loop.call_soon_threadsafe(self._dispatch, event)
+
+    def _dispatch(self, event: Event) -> None:
+        card = event.get("library_card_number")
+        for key in (("all", None), ("book", event.get("book_id")), ("card", card)):
+            for subscription in self._subscribers.get(key, ()):
+                if subscription.library_card_number not in (None, card):
+                    continue
+                subscription.push(event)
+
+
+broker = EventBroker()
+
+
+def publish_loan_event(kind: str, loan: Loan, book: Optional[Book] = None) -> None:
+    """
+    Publie un événement d'emprunt, suivi de la disponibilité du livre si fournie.
+
+    Args:
+        kind: "checkout", "return" ou "renewal"
+        loan: L'emprunt concerné (après commit)
+        book: Le livre, quand son nombre d'exemplaires disponibles a changé
+    """
+    now = datetime.now().isoformat()
+    broker.publish(
+        {
+            "type": kind,
+            "loan_id": loan.id,
+            "book_id": loan.book_id,
+            "library_card_number": loan.library_card_number,
+            "due_date": loan.due_date.isoformat(),
+            "at": now,
+        }
+    )
+    if book is not None:
+        broker.publish(
+            {
+                "type": "availability",
+                "book_id": book.id,
+                "available_copies": book.available_copies,
+                "total_copies": book.total_copies,
+                "at": now,
+            }
+        )
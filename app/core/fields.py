@@ -0,0 +1,102 @@
+from typing import Any, Optional
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.negotiation import NegotiatedResponse
+
+
+def parse_fields(fields: Optional[str], schema: type[BaseModel]) -> Optional[list[str]]:
+    """
+    Découpe le paramètre `fields=a,b,c` d'un endpoint de liste.
+
+    Args:
+        fields: Valeur brute du paramètre de requête
+        schema: Schema de lecture dont les champs sont autorisés
+
+    Returns:
+        La liste des champs demandés (`id` toujours en tête), ou None si absent
+
+    Raises:
+        HTTPException: Si un champ n'existe pas dans le schema
+    """
+    if not fields:
+        return None
+
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in schema.model_fields]
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Champs inconnus : {', '.join(unknown)}"
+        )
+
+    return list(dict.fromkeys(["id", *requested]))
+
+
+def parse_include(include: Optional[str], allowed: tuple[str, ...]) -> list[str]:
+    """
+    Découpe le paramètre `include=a,b` (relations et compteurs à joindre).
+
+    Raises:
+        HTTPException: Si une expansion n'est pas proposée par l'endpoint
+    """
+    if not include:
+        return []
+
+    requested = [name.strip() for name in include.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Expansions inconnues : {', '.join(unknown)}"
+            + f" (disponibles : {', '.join(allowed)})",
+        )
+
+    return list(dict.fromkeys(requested))
+
+
+def parse_ids(ids: str) -> list[int]:
+    """
+    Découpe le paramètre `ids=3,1,2` d'une lecture groupée (ordre conservé,
+    doublons retirés, au plus `MAX_PAGE_SIZE` identifiants).
+
+    Raises:
+        HTTPException: Si un identifiant n'est pas un entier ou s'il y en a trop
+    """
+    try:
+        values = [int(value) for value in ids.split(",") if value.strip()]
+    except ValueError:
+        raise HTTPException(
+            status_code=400, detail="Les identifiants doivent être des entiers"
+        )
+
+    values = list(dict.fromkeys(values))
+    if not values:
+        raise HTTPException(status_code=400, detail="Aucun identifiant fourni")
+    if len(values) > settings.MAX_PAGE_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Au plus {settings.MAX_PAGE_SIZE} identifiants par requête",
+        )
+
+    return values
+
+
+def sparse_page(
+    items: list[dict[str, Any]], total: int, page: int, page_size: int, **extra: Any
+) -> NegotiatedResponse:
+    """Construit une réponse paginée partielle (hors `response_model`)"""
+    return NegotiatedResponse(
+        content=jsonable_encoder(
+            {
+                "items": items,
+                "total": total,
+                "page": page,
+                "page_size": page_size,
+                "total_pages": (total + page_size - 1) // page_size,
+                **extra,
+            }
+        )
+    )
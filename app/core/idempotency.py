@@ -0,0 +1,150 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Annotated, Any, Optional
+
+from fastapi import Header, HTTPException
+from pydantic import BaseModel
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.database import write_engines
+from app.core.negotiation import NegotiatedResponse
+from app.core.write_queue import WriteJob, run_write
+from app.models.idempotencyKey import IdempotencyKey
+
+IdempotencyKeyHeader = Annotated[
+    Optional[str], Header(alias="Idempotency-Key", max_length=255)
+]
+
+
+def request_hash(scope: str, payload: Optional[BaseModel]) -> str:
+    body = payload.model_dump(mode="json") if payload is not None else None
+    raw = json.dumps([scope, body], sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def replay_response(
+    session: Session,
+    key: Optional[str],
+    scope: str,
+    payload: Optional[BaseModel] = None,
+) -> Optional[NegotiatedResponse]:
+    """
+    Renvoie la réponse mémorisée pour cette clé, sans réexécuter la route.
+
+    Raises:
+        HTTPException: Si la clé a déjà servi pour une autre requête
+    """
+    if not key:
+        return None
+
+    stored = session.get(IdempotencyKey, key)
+    if stored is None:
+        return None
+
+    expires_at = stored.created_at + timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS)
+    if expires_at < datetime.now():
+        session.delete(stored)
+        session.flush()
+        return None
+
+    if stored.scope != scope or stored.request_hash != request_hash(scope, payload):
+        raise HTTPException(
+            status_code=422,
+            detail="Clé d'idempotence déjà utilisée pour une requête différente",
+        )
+
+    return NegotiatedResponse(
+        status_code=stored.status_code,
+        content=stored.response,
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+class IdempotencyConflict(Exception):
+    """Une requête concurrente a enregistré la même clé en premier"""
+
+
+def remember_response(
+    session: Session,
+    key: Optional[str],
+    scope: str,
+    payload: Optional[BaseModel],
+    status_code: int,
+    response: BaseModel,
+) -> None:
+    """
+    Mémorise la réponse dans la transaction en cours (le commit reste à faire).
+
+    Raises:
+        IdempotencyConflict: Si la clé vient d'être enregistrée par une autre
+            requête ; l'appelant doit alors annuler ses propres écritures
+    """
+    if not key:
+        return
+    try:
+        with session.begin_nested():
+            session.add(
+                IdempotencyKey(
+                    key=key,
+                    scope=scope,
+                    request_hash=request_hash(scope, payload),
+                    status_code=status_code,
+                    response=response.model_dump(mode="json"),
+                )
+            )
+    except IntegrityError as exc:
+        raise IdempotencyConflict(key) from exc
+
+
+def run_idempotent_write(
+    session: Session,
+    key: Optional[str],
+    scope: str,
+    payload: Optional[BaseModel],
+    job: WriteJob,
+) -> Any:
+    """
+    Exécute une écriture d'emprunt, ou rejoue la réponse déjà mémorisée.
+
+    Si une requête concurrente avec la même clé gagne la course, les écritures
+    de celle-ci sont annulées et la réponse de la gagnante est renvoyée.
+    """
+    replay = replay_response(session, key, scope, payload)
+    if replay:
+        return replay
+    try:
+        return run_write(session, job)
+    except IdempotencyConflict:
+        session.rollback()
+        return replay_response(session, key, scope, payload)
+
+
+def purge_expired_keys(session: Session) -> int:
+    """Supprime les clés expirées par lots, une transaction courte par lot"""
+    cutoff = datetime.now() - timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS)
+    purged = 0
+    while True:
+        expired = (
+            select(IdempotencyKey.key)
+            .where(IdempotencyKey.created_at < cutoff)
+            .limit(settings.IDEMPOTENCY_PURGE_BATCH_SIZE)
+        )
+        result = session.execute(
+            delete(IdempotencyKey).where(IdempotencyKey.key.in_(expired))
+        )
+        session.commit()
+        purged += result.rowcount
+        if result.rowcount < settings.IDEMPOTENCY_PURGE_BATCH_SIZE:
+            return purged
+
+
+def run_purge_idempotency_job() -> int:
+    purged = 0
+    for bind in write_engines().values():
+        with Session(bind) as session:
+            purged += purge_expired_keys(session)
+    return purged
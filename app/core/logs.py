@@ -0,0 +1,220 @@
+import copy
+import json
+import logging
+import queue
+import re
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from app.core.config import settings
+
+# Identifiant de la requête en cours, ajouté à chaque ligne de log
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+REQUEST_ID_HEADER = b"x-request-id"
+# Identifiant fourni par le client (proxy, appelant) repris tel quel s'il est sûr
+VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+# Attributs standard d'un LogRecord, pour isoler les champs passés en `extra`
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+TRACEBACK_FORMATTER = logging.Formatter()
+
+log_metrics = {"dropped": 0, "sampled_out": 0}
+# Incrémentés depuis n'importe quel thread qui journalise
+log_metrics_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """Une ligne JSON par enregistrement, champs `extra` compris"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "request_id", None) is None:
+            record.request_id = request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Échantillonne les avertissements et erreurs répétés.
+
+    Par clé (logger, message, type d'exception) et par fenêtre de
+    `LOG_SAMPLING_WINDOW_SECONDS`, les `LOG_SAMPLING_BURST` premiers passent,
+    puis un sur `LOG_SAMPLING_RATE` ; celui qui passe porte le nombre
+    d'enregistrements écartés depuis le précédent (`sampled_out`).
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._lock = threading.Lock()
+        self._windows: dict[tuple, list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING:
+            return True
+        exc_type = record.exc_info[0].__name__ if record.exc_info else None
+        key = (record.name, record.msg, exc_type)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if (
+                window is None
+                or now - window[0] >= settings.LOG_SAMPLING_WINDOW_SECONDS
+            ):
+                if len(self._windows) >= 1000:
+                    self._windows.clear()
+                # [début de la fenêtre, vus, écartés depuis le dernier émis]
+                window = self._windows[key] = [now, 0, 0]
+            window[1] += 1
+            seen = window[1]
+            if (
+                seen > settings.LOG_SAMPLING_BURST
+                and (seen - settings.LOG_SAMPLING_BURST) % settings.LOG_SAMPLING_RATE
+            ):
+                window[2] += 1
+                with log_metrics_lock:
+                    log_metrics["sampled_out"] += 1
+                return False
+            if window[2]:
+                record.sampled_out = window[2]
+                window[2] = 0
+        return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    File bornée : si l'écriture sur la sortie ne suit plus, les enregistrements
+    sont comptés puis abandonnés plutôt que de bloquer la requête.
+    """
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with log_metrics_lock:
+                log_metrics["dropped"] += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Message et trace figés en texte avant de changer de thread ; la trace
+        # reste à part (`exc_text`) pour le format JSON
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = TRACEBACK_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_listener: Optional[QueueListener] = None
+
+
+def configure_logging() -> None:
+    """
+    Tous les logs (uvicorn compris) passent par une file lue par un thread
+    d'écriture : les requêtes n'attendent jamais la sortie standard.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    if settings.LOG_JSON:
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(
+            logging.Formatter("%(asctime)s %(levelname)s [%(request_id)s] %(message)s")
+        )
+
+    handler = DroppingQueueHandler(queue.Queue(settings.LOG_QUEUE_SIZE))
+    handler.addFilter(RequestIdFilter())
+    handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(settings.LOG_LEVEL)
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        logger = logging.getLogger(name)
+        logger.handlers = []
+        logger.propagate = True
+
+    _listener = QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging() -> None:
+    """
+    Vide la file puis arrête le thread d'écriture (arrêt de l'application) ;
+    les derniers logs sont ensuite écrits directement.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        logging.getLogger().handlers = list(_listener.handlers)
+        _listener = None
+
+
+def log_snapshot() -> dict[str, int]:
+    with log_metrics_lock:
+        return dict(log_metrics)
+
+
+class RequestIdMiddleware:
+    """
+    Donne un identifiant à chaque requête (`X-Request-ID` reçu, sinon généré),
+    le garde pour les logs et le renvoie dans la réponse.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        received = dict(scope["headers"]).get(REQUEST_ID_HEADER, b"").decode("latin-1")
+        current = received if VALID_REQUEST_ID.match(received) else uuid.uuid4().hex
+        # Visible aussi du gestionnaire d'erreurs 500, appelé hors de ce middleware
+        scope.setdefault("state", {})["request_id"] = current
+        token = request_id.set(current)
+
+        async def send_with_id(message: dict) -> None:
+            if message["type"] == "http.response.start":
+                message = {
+                    **message,
+                    "headers": [
+                        *message.get("headers", []),
+                        (REQUEST_ID_HEADER, current.encode()),
+                    ],
+                }
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(token)
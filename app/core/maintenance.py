@@ -0,0 +1,186 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from datetime import time as clock
+from datetime import timedelta
+from typing import Any, Callable, Optional
+
+from sqlalchemy import Connection, Engine
+
+from app.core.config import settings
+from app.core.database import write_engines
+from app.core.write_queue import retry_on_busy
+
+logger = logging.getLogger(__name__)
+
+AUTO_VACUUM_MODES = {0: "none", 1: "full", 2: "incremental"}
+
+
+def parse_window(window: str) -> tuple[clock, clock]:
+    """« HH:MM-HH:MM » en heure locale ; une fenêtre peut passer minuit"""
+    start, _, end = window.partition("-")
+    return clock.fromisoformat(start.strip()), clock.fromisoformat(end.strip())
+
+
+def window_start(now: datetime, windows: list[str]) -> Optional[datetime]:
+    """Début de la fenêtre de maintenance qui contient `now`, sinon None"""
+    for window in windows:
+        start, end = parse_window(window)
+        today = datetime.combine(now.date(), start)
+        current = now.time()
+        if start <= end:
+            if start <= current < end:
+                return today
+        elif current >= start:
+            return today
+        elif current < end:
+            return today - timedelta(days=1)
+    return None
+
+
+def analyze(connection: Connection) -> Optional[str]:
+    # Statistiques échantillonnées : coût borné même sur une grosse base
+    connection.exec_driver_sql(
+        f"PRAGMA analysis_limit = {settings.MAINTENANCE_ANALYSIS_LIMIT}"
+    )
+    connection.exec_driver_sql("ANALYZE")
+    connection.exec_driver_sql("PRAGMA optimize")
+    return None
+
+
+def incremental_vacuum(connection: Connection) -> Optional[str]:
+    """Rend au système les pages libres, par paquets (auto_vacuum incrémental)"""
+    mode = connection.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+    if mode != 2:
+        # Le mode ne change qu'à la création ou par un VACUUM complet
+        return f"auto_vacuum {AUTO_VACUUM_MODES.get(mode)} : conversion requise"
+    # execute() de sqlite3 ne fait qu'un pas de la PRAGMA (une page libérée) :
+    # executescript() la mène à son terme
+    connection.connection.driver_connection.executescript(
+        f"PRAGMA incremental_vacuum({settings.MAINTENANCE_VACUUM_PAGES})"
+    )
+    return None
+
+
+def wal_checkpoint(connection: Connection) -> Optional[str]:
+    mode = connection.exec_driver_sql("PRAGMA journal_mode").scalar()
+    if mode != "wal":
+        return f"journal_mode {mode}"
+    connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    return None
+
+
+# Une étape renvoie None, ou la raison pour laquelle elle a été sautée
+STEPS: list[tuple[str, Callable[[Connection], Optional[str]]]] = [
+    ("analyze", analyze),
+    ("incremental_vacuum", incremental_vacuum),
+    ("wal_checkpoint", wal_checkpoint),
+]
+
+
+class DatabaseMaintenance:
+    """
+    Entretien de la base pendant les fenêtres creuses `MAINTENANCE_WINDOWS`.
+
+    Vérifiée toutes les `MAINTENANCE_CHECK_SECONDS`, la maintenance tourne au
+    plus une fois par fenêtre, sur la base principale puis sur celle de chaque
+    succursale. Chaque étape prend le verrou d'écriture de sa base et est
+    reprise si la base est occupée ; l'échec d'une étape n'empêche pas les
+    suivantes. Une étape sans objet (base pas en auto_vacuum incrémental, pas
+    en WAL) est notée sautée, avec sa raison.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.last_window: Optional[datetime] = None
+        self.last_run: Optional[dict[str, Any]] = None
+        self.runs = 0
+
+    def run_if_due(self, now: Optional[datetime] = None) -> bool:
+        start = window_start(now or datetime.now(), settings.MAINTENANCE_WINDOWS)
+        if start is None or start == self.last_window:
+            return False
+        self.last_window = start
+        self.run()
+        return True
+
+    def run(self) -> dict[str, Any]:
+        with self._lock:
+            started_at = datetime.now()
+            timings: dict[str, dict[str, float]] = {}
+            errors: dict[str, dict[str, str]] = {}
+            skipped: dict[str, dict[str, str]] = {}
+            for database, bind in write_engines().items():
+                timings[database] = {}
+                for name, step in STEPS:
+                    started = time.perf_counter()
+                    try:
+                        with bind.connect() as connection:
+                            reason = retry_on_busy(
+                                lambda: step(connection), connection.rollback
+                            )
+                        if reason:
+                            skipped.setdefault(database, {})[name] = reason
+                    except Exception as exc:
+                        logger.exception(
+                            "Échec de l'étape de maintenance %s (%s)", name, database
+                        )
+                        errors.setdefault(database, {})[name] = str(exc)
+                    timings[database][name] = round(
+                        (time.perf_counter() - started) * 1000, 1
+                    )
+
+            self.runs += 1
+            self.last_run = {
+                "started_at": started_at.isoformat(),
+                "timings_ms": timings,
+                "errors": errors,
+                "skipped": skipped,
+            }
+            return self.last_run
+
+
+maintenance = DatabaseMaintenance()
+
+
+def run_maintenance_job() -> None:
+    maintenance.run_if_due()
+
+
+def database_stats(bind: Engine) -> dict[str, Any]:
+    """Taille du fichier, pages libres et modes d'une base"""
+    with bind.connect() as connection:
+
+        def pragma(name: str) -> Any:
+            return connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+        stats = {
+            "page_size": pragma("page_size"),
+            "page_count": pragma("page_count"),
+            "freelist_pages": pragma("freelist_count"),
+            "auto_vacuum": AUTO_VACUUM_MODES.get(pragma("auto_vacuum")),
+            # auto_vacuum fixé à la création : une base existante se convertit
+            # par `PRAGMA auto_vacuum = INCREMENTAL; VACUUM;`
+            "auto_vacuum_conversion_required": pragma("auto_vacuum") != 2,
+            "journal_mode": pragma("journal_mode"),
+        }
+
+    path = bind.url.database
+    if path and path != ":memory:" and os.path.exists(path):
+        stats["file_size_bytes"] = os.path.getsize(path)
+        wal = f"{path}-wal"
+        stats["wal_size_bytes"] = os.path.getsize(wal) if os.path.exists(wal) else 0
+    return stats
+
+
+def maintenance_snapshot() -> dict[str, Any]:
+    return {
+        "databases": {
+            database: database_stats(bind) for database, bind in write_engines().items()
+        },
+        "windows": settings.MAINTENANCE_WINDOWS,
+        "runs": maintenance.runs,
+        "last_run": maintenance.last_run,
+    }
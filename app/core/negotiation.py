@@ -0,0 +1,138 @@
+import json
+from contextvars import ContextVar
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import msgpack
+except ImportError:  # dépendance optionnelle : JSON seul sans elle
+    msgpack = None
+
+MSGPACK = "application/msgpack"
+MSGPACK_TYPES = {MSGPACK, "application/x-msgpack"}
+JSON_TYPES = {"application/json", "application/*", "*/*"}
+
+# Format négocié pour la requête en cours, lu au moment de rendre la réponse
+wants_msgpack: ContextVar[bool] = ContextVar("wants_msgpack", default=False)
+
+
+def prefers_msgpack(accept: str) -> bool:
+    """Vrai si `Accept` donne à MessagePack une qualité au moins égale à JSON"""
+    qualities: dict[str, float] = {}
+    for token in accept.split(","):
+        media_type, *params = [part.strip() for part in token.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        media_type = media_type.lower()
+        qualities[media_type] = max(quality, qualities.get(media_type, 0.0))
+
+    msgpack_quality = max(qualities.get(name, 0.0) for name in MSGPACK_TYPES)
+    json_quality = max(qualities.get(name, 0.0) for name in JSON_TYPES)
+    return msgpack_quality > 0 and msgpack_quality >= json_quality
+
+
+class NegotiatedResponse(JSONResponse):
+    """
+    Réponse JSON, ou MessagePack si le client l'a demandé avec `Accept`.
+
+    Le contenu est celui que FastAPI a déjà validé avec le `response_model` :
+    seuls l'encodage final et le Content-Type changent.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if msgpack is not None and wants_msgpack.get():
+            self.media_type = MSGPACK
+            return msgpack.packb(content)
+        return super().render(content)
+
+
+class NegotiationMiddleware:
+    """
+    Négociation JSON / MessagePack.
+
+    Retient le format demandé par `Accept` pour `NegotiatedResponse`, et
+    convertit en JSON les corps de requête envoyés en `application/msgpack`
+    avant leur validation par les schemas habituels.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or msgpack is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        accept = headers.get(b"accept", b"").decode("latin-1")
+        token = wants_msgpack.set(prefers_msgpack(accept))
+
+        async def send_with_vary(message: dict) -> None:
+            if message["type"] == "http.response.start":
+                message = {
+                    **message,
+                    "headers": [*message.get("headers", []), (b"vary", b"Accept")],
+                }
+            await send(message)
+
+        try:
+            content_type = headers.get(b"content-type", b"").split(b";")[0]
+            if content_type.strip().decode("latin-1").lower() in MSGPACK_TYPES:
+                body = await read_body(receive)
+                try:
+                    payload = json.dumps(msgpack.unpackb(body)).encode()
+                except (ValueError, TypeError, msgpack.UnpackException):
+                    response = NegotiatedResponse(
+                        status_code=400,
+                        content={"detail": "Corps MessagePack invalide"},
+                    )
+                    await response(scope, receive, send_with_vary)
+                    return
+                scope = {**scope, "headers": json_headers(scope["headers"], payload)}
+                receive = replay_body(payload, receive)
+            await self.app(scope, receive, send_with_vary)
+        finally:
+            wants_msgpack.reset(token)
+
+
+async def read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body", False):
+            return body
+
+
+def replay_body(body: bytes, receive):
+    """`receive` qui livre `body`, puis attend la déconnexion du client"""
+    sent = False
+
+    async def replay() -> dict:
+        nonlocal sent
+        if sent:
+            return await receive()
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return replay
+
+
+def json_headers(headers: list[tuple[bytes, bytes]], body: bytes) -> list:
+    """En-têtes de la requête réécrite en JSON (type et longueur du corps)"""
+    kept = [
+        (name, value)
+        for name, value in headers
+        if name not in (b"content-type", b"content-length")
+    ]
+    return [
+        *kept,
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+    ]
@@ -0,0 +1,81 @@
+from sqlalchemy import delete, tuple_
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, func, select, union
+
+from app.core.config import settings
+from app.core.database import write_engines
+from app.models.bookCooccurrence import BookCooccurrence
+from app.models.loan import Loan
+from app.models.loanHistory import LoanHistory
+
+
+def record_co_borrowing(session: Session, library_card_number: str, book_id: int):
+    """
+    Met à jour l'index « aussi empruntés » pour un nouvel emprunt.
+
+    À appeler avant d'ajouter l'emprunt à la session, dans la même transaction.
+    Un lecteur qui réemprunte un livre déjà lu ne compte pas deux fois.
+    """
+    previous_books = set(
+        session.execute(
+            union(
+                select(Loan.book_id).where(
+                    Loan.library_card_number == library_card_number
+                ),
+                select(LoanHistory.book_id).where(
+                    LoanHistory.library_card_number == library_card_number
+                ),
+            )
+        )
+        .scalars()
+        .all()
+    )
+    if not previous_books or book_id in previous_books:
+        return
+
+    pairs = []
+    for other_id in previous_books:
+        pairs.append({"book_id": book_id, "related_book_id": other_id, "co_loans": 1})
+        pairs.append({"book_id": other_id, "related_book_id": book_id, "co_loans": 1})
+
+    statement = insert(BookCooccurrence).values(pairs)
+    session.execute(
+        statement.on_conflict_do_update(
+            index_elements=["book_id", "related_book_id"],
+            set_={"co_loans": BookCooccurrence.co_loans + 1},
+        )
+    )
+
+
+def prune_co_borrowing(session: Session, keep: int | None = None) -> int:
+    """Ne garde que les `keep` livres les plus co-empruntés pour chaque livre"""
+    keep = keep or settings.RELATED_KEEP_PER_BOOK
+    ranked = select(
+        BookCooccurrence.book_id,
+        BookCooccurrence.related_book_id,
+        func.row_number()
+        .over(
+            partition_by=BookCooccurrence.book_id,
+            order_by=BookCooccurrence.co_loans.desc(),
+        )
+        .label("rank"),
+    ).subquery()
+    result = session.execute(
+        delete(BookCooccurrence).where(
+            tuple_(BookCooccurrence.book_id, BookCooccurrence.related_book_id).in_(
+                select(ranked.c.book_id, ranked.c.related_book_id).where(
+                    ranked.c.rank > keep
+                )
+            )
+        )
+    )
+    session.commit()
+    return result.rowcount
+
+
+def run_prune_job() -> int:
+    pruned = 0
+    for bind in write_engines().values():
+        with Session(bind) as session:
+            pruned += prune_co_borrowing(session)
+    return pruned
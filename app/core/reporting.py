@@ -0,0 +1,132 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Annotated, Any, Optional
+
+from fastapi import Depends, Response
+from sqlalchemy.pool import NullPool
+from sqlmodel import Session, create_engine
+
+from app.core.config import settings
+from app.core.database import engine, request_engine
+
+logger = logging.getLogger(__name__)
+
+
+class ReportingDatabase:
+    """
+    Copie en lecture seule de la base principale pour les requêtes d'analyse.
+
+    La copie est faite avec l'API de sauvegarde en ligne de SQLite, par pas de
+    `REPORTING_BACKUP_PAGES` pages pour ne pas bloquer les écritures pendant
+    toute la copie, dans un fichier temporaire qui remplace ensuite la copie
+    précédente. Les connexions ne sont pas gardées en pool : chaque session
+    ouvre la dernière copie, celles en cours finissent sur l'ancienne.
+    """
+
+    def __init__(self, path: Optional[str]) -> None:
+        self.path = path
+        self.engine = None
+        self.refreshed_at: Optional[datetime] = None
+        self._refreshed_monotonic = 0.0
+        self.last_duration_ms = 0.0
+        self.refreshes = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def staleness(self) -> float:
+        """Âge de la copie en secondes"""
+        return time.monotonic() - self._refreshed_monotonic
+
+    def refresh(self) -> None:
+        with self._lock:
+            started_at = datetime.now()
+            started = time.monotonic()
+            copy_path = f"{self.path}.tmp"
+            try:
+                self._backup(copy_path)
+                os.replace(copy_path, self.path)
+            except Exception:
+                self.failures += 1
+                raise
+
+            if self.engine is None:
+                self.engine = create_engine(
+                    f"sqlite:///file:{self.path}?mode=ro&uri=true",
+                    connect_args={"check_same_thread": False},
+                    poolclass=NullPool,
+                )
+            # La copie reflète la base au début de la sauvegarde
+            self.refreshed_at = started_at
+            self._refreshed_monotonic = started
+            self.last_duration_ms = (time.monotonic() - started) * 1000
+            self.refreshes += 1
+
+    def _backup(self, copy_path: str) -> None:
+        source = engine.raw_connection()
+        try:
+            target = sqlite3.connect(copy_path)
+            try:
+                source.driver_connection.backup(
+                    target,
+                    pages=settings.REPORTING_BACKUP_PAGES,
+                    sleep=settings.REPORTING_BACKUP_SLEEP_MS / 1000,
+                )
+            finally:
+                target.close()
+        finally:
+            source.close()
+
+
+reporting_db = ReportingDatabase(settings.REPORTING_DATABASE_PATH)
+
+
+def run_reporting_refresh_job() -> None:
+    reporting_db.refresh()
+
+
+def reporting_snapshot() -> dict[str, Any]:
+    if reporting_db.engine is None:
+        return {"enabled": reporting_db.enabled, "refreshes": 0}
+    return {
+        "enabled": True,
+        "refreshed_at": reporting_db.refreshed_at.isoformat(),
+        "staleness_seconds": round(reporting_db.staleness(), 1),
+        "last_duration_ms": round(reporting_db.last_duration_ms, 1),
+        "refreshes": reporting_db.refreshes,
+        "failures": reporting_db.failures,
+    }
+
+
+def get_reporting_session(response: Response):
+    """
+    Session sur la copie d'analyse, ou sur la base principale sans copie.
+
+    La copie ne reprend que la base principale : une requête de succursale est
+    servie directement par la base de sa succursale. L'âge de la copie est
+    renvoyé dans les en-têtes de la réponse ; les routes qui l'utilisent
+    doivent renvoyer un modèle (pas une `Response`) pour que FastAPI les
+    recopie.
+    """
+    branch_engine = request_engine.get()
+    if branch_engine is not None or reporting_db.engine is None:
+        with Session(branch_engine or engine) as session:
+            yield session
+        return
+
+    response.headers["X-Snapshot-Taken-At"] = reporting_db.refreshed_at.isoformat()
+    response.headers["X-Snapshot-Staleness-Seconds"] = str(
+        int(reporting_db.staleness())
+    )
+    with Session(reporting_db.engine) as session:
+        yield session
+
+
+ReportingSessionDep = Annotated[Session, Depends(get_reporting_session)]
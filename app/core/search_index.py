@@ -0,0 +1,305 @@
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+
+from sqlmodel import Session, select
+
+from app.core.changefeed import changes_after, latest_change_id
+from app.core.config import settings
+from app.core.database import engine
+from app.models.author import Author
+from app.models.book import Book
+from app.models.change import Change
+
+# (type, id, libellé affiché, variantes indexées)
+IndexEntry = tuple[str, int, str, tuple[str, ...]]
+
+
+WORD_START = re.compile(r"(?<=[\W_])\w")
+
+
+def fold(text: str) -> str:
+    """Normalise un texte pour la recherche (sans accents, sans casse)"""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.casefold().split())
+
+
+def trigrams(text: str) -> set[str]:
+    """Trigrammes de chaque mot, complétés par des espaces (comme pg_trgm)"""
+    grams: set[str] = set()
+    for word in fold(text).split():
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def book_entry(book_id: int, title: str) -> IndexEntry:
+    return ("book", book_id, title, ())
+
+
+def author_entry(author_id: int, first_name: str, last_name: str) -> IndexEntry:
+    """Un auteur est indexé en « Prénom Nom » et en « Nom Prénom »"""
+    return (
+        "author",
+        author_id,
+        f"{first_name} {last_name}",
+        (f"{last_name} {first_name}",),
+    )
+
+
+class PrefixIndex:
+    """
+    Index de préfixes en mémoire pour l'autocomplétion.
+
+    Les clés normalisées sont gardées dans un tableau trié : une recherche est
+    une recherche dichotomique puis un parcours des k premières entrées. Chaque
+    libellé est indexé à partir de chacun de ses mots (« mis » trouve « Les
+    Misérables »). L'index est propre à chaque processus : tenu à jour par les
+    routes d'écriture du processus, et par `sync_search_indexes` pour celles
+    des autres workers.
+    """
+
+    def __init__(self) -> None:
+        self._keys: list[tuple[str, str, int]] = []
+        self._entries: dict[tuple[str, int], tuple[str, list[str]]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _fold_keys(label: str, variants: tuple[str, ...]) -> list[str]:
+        """Libellé et variantes normalisés, puis leur suite à partir de chaque mot"""
+        keys: dict[str, None] = {}
+        for text in (label, *variants):
+            folded = fold(text)
+            keys[folded] = None
+            # « Notre-Dame », « L'Étranger » : un mot commence après tout séparateur
+            for word in WORD_START.finditer(folded):
+                keys[folded[word.start() :]] = None
+        return list(keys)
+
+    def add(self, entry: IndexEntry) -> None:
+        """Ajoute ou remplace une entrée, indexée sur son libellé et ses variantes"""
+        kind, item_id, label, variants = entry
+        keys = self._fold_keys(label, variants)
+        with self._lock:
+            self._remove(kind, item_id)
+            self._entries[(kind, item_id)] = (label, keys)
+            for key in keys:
+                insort(self._keys, (key, kind, item_id))
+
+    def remove(self, kind: str, item_id: int) -> None:
+        with self._lock:
+            self._remove(kind, item_id)
+
+    def _remove(self, kind: str, item_id: int) -> None:
+        entry = self._entries.pop((kind, item_id), None)
+        if entry is None:
+            return
+        for key in entry[1]:
+            position = bisect_left(self._keys, (key, kind, item_id))
+            if position < len(self._keys) and self._keys[position] == (
+                key,
+                kind,
+                item_id,
+            ):
+                del self._keys[position]
+
+    def load(self, entries: list[IndexEntry]) -> None:
+        """Remplace tout le contenu de l'index (tri unique plutôt qu'insertions)"""
+        fresh = {
+            (kind, item_id): (label, self._fold_keys(label, variants))
+            for kind, item_id, label, variants in entries
+        }
+        keys = sorted(
+            (key, kind, item_id)
+            for (kind, item_id), (_, entry_keys) in fresh.items()
+            for key in entry_keys
+        )
+        with self._lock:
+            self._keys, self._entries = keys, fresh
+
+    def search(self, prefix: str, limit: int = 10) -> list[tuple[str, int, str]]:
+        """Renvoie jusqu'à `limit` entrées (type, id, libellé) par ordre alphabétique"""
+        folded = fold(prefix)
+        results: list[tuple[str, int, str]] = []
+        seen: set[tuple[str, int]] = set()
+        with self._lock:
+            position = bisect_left(self._keys, (folded,))
+            while position < len(self._keys) and len(results) < limit:
+                key, kind, item_id = self._keys[position]
+                if not key.startswith(folded):
+                    break
+                if (kind, item_id) not in seen:
+                    seen.add((kind, item_id))
+                    results.append((kind, item_id, self._entries[(kind, item_id)][0]))
+                position += 1
+        return results
+
+
+class TrigramIndex:
+    """
+    Index inversé de trigrammes pour la recherche tolérante aux fautes.
+
+    Seules les entrées partageant au moins un trigramme avec la requête sont
+    examinées, sans calcul de distance d'édition sur tous les noms. Propre à
+    chaque processus et synchronisé comme `PrefixIndex`.
+    """
+
+    def __init__(self) -> None:
+        self._postings: dict[str, set[tuple[str, int]]] = defaultdict(set)
+        self._entries: dict[tuple[str, int], tuple[str, set[str]]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, entry: IndexEntry) -> None:
+        kind, item_id, label, _ = entry
+        grams = trigrams(label)
+        with self._lock:
+            self._remove(kind, item_id)
+            self._entries[(kind, item_id)] = (label, grams)
+            for gram in grams:
+                self._postings[gram].add((kind, item_id))
+
+    def remove(self, kind: str, item_id: int) -> None:
+        with self._lock:
+            self._remove(kind, item_id)
+
+    def _remove(self, kind: str, item_id: int) -> None:
+        entry = self._entries.pop((kind, item_id), None)
+        if entry is None:
+            return
+        for gram in entry[1]:
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard((kind, item_id))
+                if not posting:
+                    del self._postings[gram]
+
+    def load(self, entries: list[IndexEntry]) -> None:
+        fresh = TrigramIndex()
+        for entry in entries:
+            fresh.add(entry)
+        with self._lock:
+            self._postings, self._entries = fresh._postings, fresh._entries
+
+    def search(
+        self, query: str, kind: str, limit: int = 10, min_similarity: float = 0.0
+    ) -> list[tuple[int, str, float]]:
+        """
+        Cherche les entrées d'un type les plus proches de `query`.
+
+        La similarité est la part des trigrammes de la requête présents dans
+        l'entrée ; à égalité, l'entrée la plus courte l'emporte.
+
+        Returns:
+            Liste (id, libellé, similarité) triée par similarité décroissante
+        """
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+        min_similarity = min_similarity or settings.FUZZY_MIN_SIMILARITY
+
+        with self._lock:
+            shared: Counter[tuple[str, int]] = Counter()
+            for gram in query_grams:
+                shared.update(self._postings.get(gram, ()))
+
+            scored = []
+            for key, count in shared.items():
+                similarity = count / len(query_grams)
+                if similarity < min_similarity or key[0] != kind:
+                    continue
+                label, grams = self._entries[key]
+                jaccard = count / (len(query_grams) + len(grams) - count)
+                scored.append((similarity, jaccard, key[1], label))
+
+        scored.sort(key=lambda item: (-item[0], -item[1], item[3]))
+        return [
+            (item_id, label, round(similarity, 3))
+            for similarity, _, item_id, label in scored[:limit]
+        ]
+
+
+autocomplete_index = PrefixIndex()
+fuzzy_index = TrigramIndex()
+SEARCH_INDEXES: tuple[PrefixIndex | TrigramIndex, ...] = (
+    autocomplete_index,
+    fuzzy_index,
+)
+
+
+def index_book(book: Book) -> None:
+    for index in SEARCH_INDEXES:
+        index.add(book_entry(book.id, book.title))
+
+
+def index_author(author: Author) -> None:
+    for index in SEARCH_INDEXES:
+        index.add(author_entry(author.id, author.first_name, author.last_name))
+
+
+def unindex(kind: str, item_id: int) -> None:
+    for index in SEARCH_INDEXES:
+        index.remove(kind, item_id)
+
+
+# Position des index dans le journal des modifications (écritures des autres
+# workers)
+search_change_cursor = 0
+
+
+def build_search_indexes(session: Session) -> None:
+    """Reconstruit les index à partir des tables `books` et `authors`"""
+    global search_change_cursor
+    # Curseur lu avant les lignes : une écriture entre les deux est rejouée
+    cursor = latest_change_id(session)
+    entries = [
+        book_entry(book_id, title)
+        for book_id, title in session.exec(select(Book.id, Book.title)).all()
+    ]
+    authors = session.exec(select(Author.id, Author.first_name, Author.last_name))
+    entries.extend(author_entry(*row) for row in authors.all())
+    for index in SEARCH_INDEXES:
+        index.load(entries)
+    search_change_cursor = cursor
+
+
+def change_entry(change: Change) -> IndexEntry:
+    """Entrée d'index à partir de l'état enregistré dans le journal"""
+    if change.entity == "book":
+        return book_entry(change.entity_id, change.payload["title"])
+    return author_entry(
+        change.entity_id, change.payload["first_name"], change.payload["last_name"]
+    )
+
+
+def sync_search_indexes() -> None:
+    """
+    Applique aux index les livres et auteurs créés, renommés ou supprimés par
+    les autres workers, lus dans le journal des modifications : au plus
+    `SEARCH_INDEX_SYNC_SECONDS` de retard. Journal purgé au-delà du curseur :
+    les index sont reconstruits.
+    """
+    global search_change_cursor
+    with Session(engine) as session:
+        found = changes_after(session, search_change_cursor, ("book", "author"))
+        if found is None:
+            build_search_indexes(session)
+            return
+    changes, cursor = found
+    # Dernier état de chaque entrée seulement
+    latest = {(change.entity, change.entity_id): change for change in changes}
+    for (kind, item_id), change in latest.items():
+        for index in SEARCH_INDEXES:
+            if change.operation == "delete":
+                index.remove(kind, item_id)
+            else:
+                index.add(change_entry(change))
+    search_change_cursor = cursor
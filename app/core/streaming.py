@@ -0,0 +1,62 @@
+from itertools import chain
+from typing import Iterable, Iterator, Optional, TypeVar
+
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.negotiation import MSGPACK, msgpack, wants_msgpack
+
+T = TypeVar("T")
+
+
+def peek(rows: Iterable[T]) -> Optional[Iterator[T]]:
+    """Itérateur sur `rows`, ou None s'il est vide (pour répondre 404 à temps)"""
+    iterator = iter(rows)
+    first = next(iterator, None)
+    if first is None:
+        return None
+    return chain([first], iterator)
+
+
+def json_array_chunks(items: Iterable[BaseModel]) -> Iterator[bytes]:
+    """Encode un tableau JSON au fil des lignes, par morceaux d'environ
+    `STREAM_CHUNK_BYTES` (assez gros pour bien se compresser)"""
+    buffer = bytearray(b"[")
+    separator = b""
+    for item in items:
+        buffer += separator
+        buffer += item.model_dump_json().encode()
+        separator = b","
+        if len(buffer) >= settings.STREAM_CHUNK_BYTES:
+            yield bytes(buffer)
+            buffer.clear()
+    buffer += b"]"
+    yield bytes(buffer)
+
+
+def msgpack_array(items: Iterable[BaseModel]) -> Response:
+    """
+    Tableau MessagePack : sa taille s'écrit en tête, avant les éléments. Ceux-ci
+    sont donc encodés un à un au fil des lignes, puis envoyés d'un bloc derrière
+    l'en-tête du tableau.
+    """
+    packer = msgpack.Packer()
+    body = bytearray()
+    count = 0
+    for item in items:
+        body += packer.pack(item.model_dump(mode="json"))
+        count += 1
+    return Response(
+        content=packer.pack_array_header(count) + bytes(body), media_type=MSGPACK
+    )
+
+
+def stream_json_array(items: Iterable[BaseModel]) -> Response:
+    """
+    Réponse JSON en flux : mémoire bornée quel que soit le nombre de lignes.
+    En MessagePack si le client l'a demandé (voir `msgpack_array`).
+    """
+    if msgpack is not None and wants_msgpack.get():
+        return msgpack_array(items)
+    return StreamingResponse(json_array_chunks(items), media_type="application/json")
@@ -0,0 +1,26 @@
+import asyncio
+import logging
+from typing import Callable
+
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+
+async def run_periodically(interval: int, job: Callable[[], object]) -> None:
+    """Exécute `job` dans le pool de threads toutes les `interval` secondes"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(job)
+        except Exception:
+            logger.exception("Échec de la tâche périodique %s", job.__name__)
+
+
+def start_periodic_tasks(jobs: list[tuple[int, Callable[[], object]]]) -> list:
+    """Démarre les tâches dont l'intervalle est non nul (appelé par le lifespan)"""
+    return [
+        asyncio.create_task(run_periodically(interval, job))
+        for interval, job in jobs
+        if interval > 0
+    ]
@@ -0,0 +1,265 @@
+import logging
+import queue
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Callable, Optional, TypeVar
+
+from fastapi import HTTPException
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.database import engine, writer_for
+
+# Une écriture applique ses changements sans commit et renvoie
+# (réponse, action à exécuter une fois le commit fait)
+WriteResult = tuple[Any, Optional[Callable[[], None]]]
+WriteJob = Callable[[Session], WriteResult]
+
+T = TypeVar("T")
+
+SQLITE_BUSY = 5
+SQLITE_LOCKED = 6
+
+logger = logging.getLogger(__name__)
+
+# Transactions d'écriture abouties, reprises sur base occupée, abandons (503)
+retry_metrics: Counter[str] = Counter(
+    transactions=0, retries=0, retried_transactions=0, exhausted=0
+)
+# Incrémentés depuis les threads des requêtes : `+=` n'est pas atomique
+retry_metrics_lock = threading.Lock()
+
+
+class GroupCommitQueue:
+    """
+    Écrivain unique qui regroupe les écritures par transaction.
+
+    Les requêtes déposent leur écriture dans une file ; un thread dédié en
+    prend autant qu'il en arrive pendant `window_ms` (au plus `max_batch`),
+    exécute chacune dans son SAVEPOINT puis fait un seul commit (un seul fsync)
+    pour tout le lot. Chaque requête reçoit son propre résultat ou sa propre
+    erreur : l'échec d'une écriture n'annule que son SAVEPOINT.
+    """
+
+    def __init__(self, window_ms: float, max_batch: int) -> None:
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._jobs: queue.Queue[Optional[tuple[WriteJob, Future]]] = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self.batches = 0
+        self.jobs = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="group-commit", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._jobs.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, job: WriteJob) -> Any:
+        """Exécute `job` dans le prochain lot et attend son résultat"""
+        future: Future = Future()
+        self._jobs.put((job, future))
+        return future.result()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._jobs.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._jobs.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._execute(batch)
+
+    def _execute(self, batch: list[tuple[WriteJob, Future]]) -> None:
+        with Session(engine) as session:
+            try:
+                outcomes = retry_on_busy(
+                    lambda: self._attempt(session, batch), session.rollback
+                )
+            except BaseException as exc:
+                for _, future in batch:
+                    future.set_exception(exc)
+                return
+
+            self.batches += 1
+            self.jobs += len(batch)
+            for future, result, after_commit, error in outcomes:
+                if error is not None:
+                    future.set_exception(error)
+                    continue
+                if after_commit:
+                    try:
+                        after_commit()
+                    except Exception:
+                        logger.exception("Échec d'une action après commit")
+                future.set_result(result)
+
+    def _attempt(self, session: Session, batch: list[tuple[WriteJob, Future]]):
+        """Un essai du lot ; une base occupée fait reprendre le lot entier"""
+        outcomes = []
+        begin_immediate(session)
+        for job, future in batch:
+            try:
+                with session.begin_nested():
+                    result, after_commit = job(session)
+            except OperationalError as exc:
+                if is_busy(exc):
+                    raise
+                outcomes.append((future, None, None, exc))
+                continue
+            except BaseException as exc:
+                outcomes.append((future, None, None, exc))
+                continue
+            outcomes.append((future, result, after_commit, None))
+        session.commit()
+        return outcomes
+
+
+write_queue = GroupCommitQueue(
+    settings.WRITE_BATCH_WINDOW_MS, settings.WRITE_BATCH_MAX_SIZE
+)
+
+
+def write_queue_snapshot() -> dict[str, int]:
+    return {"batches": write_queue.batches, "jobs": write_queue.jobs}
+
+
+def run_write(session: Session, job: WriteJob) -> Any:
+    """
+    Exécute une écriture, groupée si l'écrivain unique tourne, sinon en direct
+    dans sa propre transaction `BEGIN IMMEDIATE`, reprise si la base est occupée.
+    """
+    # L'écrivain unique sert la base principale ; chaque succursale a son verrou
+    if write_queue.running and session.bind is engine:
+        # Libère le verrou de lecture de la requête avant le commit du lot
+        session.commit()
+        return write_queue.submit(job)
+
+    # Termine ce que la requête a pu ouvrir avant de prendre le verrou d'écriture
+    session.commit()
+
+    writer = writer_for(session.bind)
+    if writer is not session.bind:
+        # Succursale : transaction sur une connexion sans la base commune
+        # attachée, pour ne verrouiller que la base de la succursale
+        with Session(writer) as write_session:
+            return run_direct(write_session, job)
+    return run_direct(session, job)
+
+
+def run_direct(session: Session, job: WriteJob) -> Any:
+    """Écriture dans sa propre transaction `BEGIN IMMEDIATE`, reprise si occupée"""
+
+    def attempt() -> WriteResult:
+        begin_immediate(session)
+        try:
+            outcome = job(session)
+            session.commit()
+        except BaseException:
+            # Refus (HTTPException) ou erreur : le verrou d'écriture est rendu
+            # tout de suite, pas à la fermeture de la session de la requête
+            session.rollback()
+            raise
+        return outcome
+
+    result, after_commit = retry_on_busy(attempt, session.rollback)
+    if after_commit:
+        after_commit()
+    return result
+
+
+def begin_immediate(session: Session) -> None:
+    """
+    Prend le verrou d'écriture dès le début de la transaction.
+
+    En mode différé, deux transactions qui ont lu avant d'écrire ne peuvent pas
+    toutes deux monter en écriture : SQLite renvoie « database is locked » sans
+    attendre. Avec `BEGIN IMMEDIATE`, l'attente a lieu ici, avant toute lecture,
+    et la transaction est explicite : pysqlite n'ouvre pas la sienne, et un
+    SAVEPOINT ne valide rien à son RELEASE.
+    """
+    session.connection().exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def is_busy(exc: OperationalError) -> bool:
+    """Vrai pour SQLITE_BUSY / SQLITE_LOCKED (codes étendus compris)"""
+    code = getattr(exc.orig, "sqlite_errorcode", None)
+    if code is not None:
+        return code & 0xFF in (SQLITE_BUSY, SQLITE_LOCKED)
+    message = str(exc.orig).lower()
+    return "locked" in message or "busy" in message
+
+
+def retry_on_busy(attempt: Callable[[], T], rollback: Callable[[], None]) -> T:
+    """
+    Rejoue `attempt` tant que la base est occupée, jusqu'à
+    `WRITE_RETRY_DEADLINE_SECONDS`.
+
+    Attente exponentielle avec gigue complète (tirage entre 0 et le plafond
+    courant) pour que les écrivains en conflit ne se réveillent pas ensemble.
+    Au-delà du délai, 503 avec Retry-After plutôt qu'une erreur 500.
+    """
+    deadline = time.monotonic() + settings.WRITE_RETRY_DEADLINE_SECONDS
+    delay = settings.WRITE_RETRY_BASE_DELAY_MS / 1000
+    max_delay = settings.WRITE_RETRY_MAX_DELAY_MS / 1000
+    retries = 0
+    while True:
+        try:
+            result = attempt()
+        except OperationalError as exc:
+            rollback()
+            if not is_busy(exc):
+                raise
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                with retry_metrics_lock:
+                    retry_metrics["exhausted"] += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Base de données occupée, réessayer plus tard",
+                    headers={"Retry-After": "1"},
+                ) from exc
+            retries += 1
+            with retry_metrics_lock:
+                retry_metrics["retries"] += 1
+            time.sleep(min(random.uniform(0, delay), remaining))
+            delay = min(delay * 2, max_delay)
+            continue
+        with retry_metrics_lock:
+            retry_metrics["transactions"] += 1
+            if retries:
+                retry_metrics["retried_transactions"] += 1
+        return result
+
+
+def retry_snapshot() -> dict[str, int]:
+    with retry_metrics_lock:
+        return dict(retry_metrics)
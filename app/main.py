@@ -1,20 +1,104 @@
+import asyncio
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy.orm import configure_mappers
+from sqlmodel import Session
+
+from app.core.admission import AdmissionMiddleware
+from app.core.branches import BranchMiddleware
+from app.core.catalog import build_catalog, sync_catalog
+from app.core.changefeed import run_prune_changes_job
+from app.core.coalescing import CoalescingMiddleware
+from app.core.compression import CompressionMiddleware
+from app.core.config import settings
+from app.core.database import create_db_and_tables, engine, verify_schema
+from app.core.error_handlers import (
+    generic_exception_handler,
+    library_exception_handler,
+    validation_exception_handler,
+)
+from app.core.events import broker
+from app.core.exceptions import LibraryException
+from app.core.idempotency import run_purge_idempotency_job
+from app.core.logs import RequestIdMiddleware, configure_logging, stop_logging
+from app.core.maintenance import run_maintenance_job
+from app.core.negotiation import NegotiatedResponse, NegotiationMiddleware
+from app.core.recommendations import run_prune_job
+from app.core.reporting import reporting_db, run_reporting_refresh_job
+from app.core.search_index import build_search_indexes, sync_search_indexes
+from app.core.tasks import start_periodic_tasks
+from app.core.write_queue import write_queue
+from app.routers import (
+    admin,
+    author,
+    autocomplete,
+    book,
+    branch,
+    changes,
+    events,
+    hold,
+    loan,
+    loanHistory,
+    report,
+)
 
-from app.core.database import create_db_and_tables
-from app.routers import author, book, loan
+
+def warm_up(app: FastAPI) -> None:
+    """Prépare mappers SQLAlchemy et schéma OpenAPI avant la première requête"""
+    configure_mappers()
+    app.openapi()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Gérer le cycle de vie de l'application"""
     # Startup
-    create_db_and_tables()
+    configure_logging()
+    if settings.SCHEMA_MODE == "verify":
+        verify_schema()
+    else:
+        create_db_and_tables()
+    warm_up(app)
+    broker.bind(asyncio.get_running_loop())
+    with Session(engine) as session:
+        build_search_indexes(session)
+        if settings.CATALOG_SNAPSHOT_ENABLED:
+            build_catalog(session)
+    if reporting_db.enabled:
+        reporting_db.refresh()
+    tasks = start_periodic_tasks(
+        [
+            (settings.ARCHIVE_INTERVAL_SECONDS, loanHistory.run_archive_job),
+            (settings.RELATED_PRUNE_INTERVAL_SECONDS, run_prune_job),
+            (settings.CHANGES_PRUNE_INTERVAL_SECONDS, run_prune_changes_job),
+            (settings.IDEMPOTENCY_PURGE_INTERVAL_SECONDS, run_purge_idempotency_job),
+            (
+                settings.REPORTING_REFRESH_SECONDS if reporting_db.enabled else 0,
+                run_reporting_refresh_job,
+            ),
+            (settings.MAINTENANCE_CHECK_SECONDS, run_maintenance_job),
+            (
+                (
+                    settings.CATALOG_SYNC_SECONDS
+                    if settings.CATALOG_SNAPSHOT_ENABLED
+                    else 0
+                ),
+                sync_catalog,
+            ),
+            (settings.SEARCH_INDEX_SYNC_SECONDS, sync_search_indexes),
+        ]
+    )
+    if settings.WRITE_BATCHING_ENABLED:
+        write_queue.start()
     yield
     # Shutdown
-    pass
+    for task in tasks:
+        task.cancel()
+    write_queue.stop()
+    stop_logging()
 
 
 # Créer l'application FastAPI
@@ -25,8 +109,20 @@ app = FastAPI(
     docs_url="/docs",
     redoc_url="/redoc",
     lifespan=lifespan,
+    default_response_class=NegotiatedResponse,
 )
 
+# Base de la succursale visée (préfixe /branches/{id} ou en-tête X-Branch)
+app.add_middleware(BranchMiddleware)
+# JSON ou MessagePack selon Accept / Content-Type (msgpack installé)
+app.add_middleware(NegotiationMiddleware)
+# Lectures identiques partagées, après la limitation de débit de chaque client
+app.add_middleware(CoalescingMiddleware)
+# Limitation de débit et admission des écritures (CORS reste la couche externe)
+app.add_middleware(AdmissionMiddleware)
+# Compression négociée des réponses (gzip, brotli si installé)
+app.add_middleware(CompressionMiddleware)
+
 # Configuration CORS
 app.add_middleware(
     CORSMiddleware,
@@ -34,13 +130,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
+# Identifiant de requête posé avant tout le reste, pour les logs de chaque couche
+app.add_middleware(RequestIdMiddleware)
+
+app.add_exception_handler(LibraryException, library_exception_handler)
+app.add_exception_handler(RequestValidationError, validation_exception_handler)
+app.add_exception_handler(Exception, generic_exception_handler)
 
 # Inclure les routers
 app.include_router(author.router)
 app.include_router(book.router)
+app.include_router(branch.router)
 app.include_router(loan.router)
-"""app.include_router(loanHistory.router)"""
+app.include_router(hold.router)
+app.include_router(loanHistory.router)
+app.include_router(autocomplete.router)
+app.include_router(events.router)
+app.include_router(changes.router)
+app.include_router(report.router)
+app.include_router(admin.router)
 
 
 @app.get("/", tags=["Root"])
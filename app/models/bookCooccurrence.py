@@ -0,0 +1,11 @@
+from sqlmodel import Field, SQLModel
+
+
+class BookCooccurrence(SQLModel, table=True):
+    """Nombre de lecteurs ayant emprunté à la fois `book_id` et `related_book_id`"""
+
+    __tablename__ = "bookCooccurrences"
+
+    book_id: int = Field(foreign_key="books.id", primary_key=True)
+    related_book_id: int = Field(foreign_key="books.id", primary_key=True)
+    co_loans: int = Field(default=0, ge=0)
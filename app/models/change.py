@@ -0,0 +1,20 @@
+from datetime import datetime
+from typing import Any, Optional
+
+from sqlmodel import JSON, Column, Field, SQLModel
+
+
+class Change(SQLModel, table=True):
+    """Entrée du journal des modifications (livres, auteurs, emprunts)"""
+
+    __tablename__ = "changes"
+    # AUTOINCREMENT : un id n'est jamais réutilisé, le jeton reste monotone
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    entity: str = Field(max_length=16)
+    entity_id: int
+    operation: str = Field(max_length=8)
+    changed_at: datetime = Field(default_factory=datetime.now, index=True)
+    # état complet après écriture ; None pour une suppression
+    payload: Optional[dict[str, Any]] = Field(default=None, sa_column=Column(JSON))
@@ -0,0 +1,29 @@
+from datetime import datetime
+from enum import Enum
+from typing import Optional
+
+from sqlmodel import Field, Index, SQLModel
+
+
+class HoldStatus(str, Enum):
+
+    WAITING = "en attente"
+    FULFILLED = "attribuée"
+    CANCELLED = "annulée"
+
+
+class Hold(SQLModel, table=True):
+
+    __tablename__ = "holds"
+    # file d'attente par livre : la tête est le plus petit id en attente
+    __table_args__ = (Index("ix_holds_queue", "book_id", "status", "id"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    book_id: int = Field(foreign_key="books.id")
+    borrower_name: str
+    borrower_email: str = Field(index=True)
+    library_card_number: str
+    created_at: datetime = Field(default_factory=datetime.now)
+    status: HoldStatus = Field(default=HoldStatus.WAITING)
+    loan_id: Optional[int] = Field(default=None, foreign_key="loans.id")
+    fulfilled_at: Optional[datetime] = Field(default=None)
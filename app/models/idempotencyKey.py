@@ -0,0 +1,17 @@
+from datetime import datetime
+from typing import Any
+
+from sqlmodel import JSON, Column, Field, SQLModel
+
+
+class IdempotencyKey(SQLModel, table=True):
+    """Réponse mémorisée pour un en-tête `Idempotency-Key` déjà traité"""
+
+    __tablename__ = "idempotencyKeys"
+
+    key: str = Field(primary_key=True, max_length=255)
+    scope: str
+    request_hash: str = Field(max_length=64)
+    status_code: int
+    response: dict[str, Any] = Field(sa_column=Column(JSON, nullable=False))
+    created_at: datetime = Field(default_factory=datetime.now, index=True)
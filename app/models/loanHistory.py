@@ -1,19 +1,26 @@
+from datetime import datetime
 from typing import Optional
 
-from sqlmodel import Field, Relationship, SQLModel
+from sqlmodel import Field, SQLModel
 
-from app.models.book import Book
-from app.models.loan import Loan
+from app.models.loan import LoanStatus
 
 
 class LoanHistory(SQLModel, table=True):
+    """Emprunt retourné archivé hors de la table `loans`"""
 
     __tablename__ = "loansHistory"
 
     id: Optional[int] = Field(default=None, primary_key=True)
-    book_id: int = Field(foreign_key="book.id", index=True)
-    total_loans: int = Field(foreign_key="loan.id", index=True)
-    book_popularity: int = Field(default=0, ge=0)
-
-    book: "Book" = Relationship(back_populates="loans")
-    loans: list["Loan"] = Relationship(back_populates="book")
+    loan_id: int = Field(index=True)
+    book_id: int = Field(foreign_key="books.id", index=True)
+    borrower_name: str = Field(index=True)
+    borrower_email: str = Field(index=True)
+    library_card_number: str = Field(index=True)
+    loan_date: datetime = Field(index=True)
+    due_date: datetime
+    return_date: Optional[datetime] = Field(default=None)
+    status: LoanStatus = Field(default=LoanStatus.RETURNED)
+    comments: Optional[str] = Field(default=None)
+    renewed: bool = Field(default=False)
+    archived_at: datetime = Field(default_factory=datetime.now)
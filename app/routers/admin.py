@@ -0,0 +1,31 @@
+from typing import Any
+
+from fastapi import APIRouter
+
+from app.core.admission import admission_snapshot
+from app.core.coalescing import coalescing_snapshot
+from app.core.logs import log_snapshot
+from app.core.maintenance import maintenance_snapshot
+from app.core.reporting import reporting_snapshot
+from app.core.write_queue import retry_snapshot, write_queue_snapshot
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+
+@router.get("/metrics")
+def get_metrics() -> dict[str, Any]:
+    """Compteurs de fonctionnement pour la supervision"""
+    return {
+        "admission": admission_snapshot(),
+        "group_commit": write_queue_snapshot(),
+        "write_retries": retry_snapshot(),
+        "coalescing": coalescing_snapshot(),
+        "reporting": reporting_snapshot(),
+        "logging": log_snapshot(),
+    }
+
+
+@router.get("/maintenance")
+def get_maintenance() -> dict[str, Any]:
+    """Taille de la base, pages libres et durées de la dernière maintenance"""
+    return maintenance_snapshot()
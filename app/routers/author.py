@@ -1,40 +1,94 @@
-from fastapi import APIRouter, HTTPException, Query
-from sqlmodel import func, select
+from collections import defaultdict
 
-from app.core.database import SessionDep
+from fastapi import APIRouter, HTTPException, Query
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, func, select
+
+from app.core.config import settings
+from app.core.database import PrimarySessionDep, SessionDep, all_engines
+from app.core.fields import parse_fields, parse_ids, parse_include, sparse_page
+from app.core.search_index import fuzzy_index, index_author, unindex
+from app.core.streaming import peek, stream_json_array
+from app.core.write_queue import WriteResult, run_write
 from app.models.author import Author
 from app.models.book import Book
+from app.models.loan import Loan
 from app.schemas.author import AuthorCreate, AuthorRead, AuthorUpdate, AuthorWithBooks
-from app.schemas.common import MessageResponse, PaginatedResponse
+from app.schemas.book import BookRead
+from app.schemas.common import BatchResponse, MessageResponse, PaginatedResponse
 
 router = APIRouter(prefix="/authors", tags=["Authors"])
 
 
 @router.post("/", response_model=AuthorRead, status_code=201)
-def create_author(author: AuthorCreate, session: SessionDep):
-    try:
-        statement = select(Author).where(
-            Author.first_name == author.first_name,
-            Author.last_name == author.last_name,
-        )
-        existing = session.exec(statement).first()
-        if existing:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Un auteur avec le nom {author.first_name}"
-                + f" {author.last_name} existe déjà",
+def create_author(author: AuthorCreate, session: PrimarySessionDep):
+    def apply(session: Session) -> WriteResult:
+        try:
+            statement = select(Author).where(
+                Author.first_name == author.first_name,
+                Author.last_name == author.last_name,
             )
+            existing = session.exec(statement).first()
+            if existing:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Un auteur avec le nom {author.first_name}"
+                    + f" {author.last_name} existe déjà",
+                )
+
+            db_author = Author.model_validate(author)
+            session.add(db_author)
+            session.flush()
+        except OperationalError:
+            # base occupée : laissée à run_write, qui reprend la transaction
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Error : {str(e)}")
+        created = AuthorRead.model_validate(db_author)
+        return created, lambda: index_author(created)
+
+    return run_write(session, apply)
+
+
+AUTHOR_INCLUDES = ("books", "books_count", "loans_count")
+
+
+def author_count_columns(included: list[str]) -> list:
+    """Compteurs demandés, en sous-requêtes corrélées de la requête principale"""
+    columns = []
+    if "books_count" in included:
+        columns.append(
+            select(func.count())
+            .where(Book.author_id == Author.id)
+            .correlate(Author)
+            .scalar_subquery()
+            .label("books_count")
+        )
+    if "loans_count" in included:
+        columns.append(
+            select(func.count())
+            .select_from(Loan)
+            .join(Book, Loan.book_id == Book.id)
+            .where(Book.author_id == Author.id)
+            .correlate(Author)
+            .scalar_subquery()
+            .label("loans_count")
+        )
+    return columns
 
-        db_author = Author.model_validate(author)
-        session.add(db_author)
-        session.commit()
-        session.refresh(db_author)
-        return db_author
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error : {str(e)}")
 
+def books_by_author(session: Session, author_ids: list[int]) -> dict[int, list]:
+    """Livres de plusieurs auteurs en une seule requête `IN`"""
+    books: dict[int, list] = defaultdict(list)
+    statement = select(Book).where(Book.author_id.in_(author_ids)).order_by(Book.id)
+    for book in session.exec(statement):
+        books[book.author_id].append(BookRead.model_validate(book))
+    return books
 
-@router.get("/", response_model=PaginatedResponse[AuthorRead])
+
+@router.get(
+    "/", response_model=PaginatedResponse[AuthorRead] | BatchResponse[AuthorRead]
+)
 def list_authors(
     session: SessionDep,
     page: int = Query(1, ge=1),
@@ -43,8 +97,25 @@ def list_authors(
     nationality: str | None = None,
     sort_by: str = Query("last_name", regex="^(last_name|first_name|birth_date)$"),
     order: str = Query("asc", regex="^(asc|desc)$"),
+    fields: str | None = Query(
+        None, description="Champs à renvoyer, séparés par des virgules"
+    ),
+    include: str | None = Query(
+        None, description="Expansions : books, books_count, loans_count"
+    ),
+    ids: str | None = Query(
+        None, description="Lecture groupée : identifiants séparés par des virgules"
+    ),
 ):
-    statement = select(Author)
+    if ids:
+        return get_authors(session, parse_ids(ids))
+
+    selected = parse_fields(fields, AuthorRead)
+    included = parse_include(include, AUTHOR_INCLUDES)
+    if selected:
+        statement = select(*(getattr(Author, name) for name in selected))
+    else:
+        statement = select(Author)
 
     if search:
         statement = statement.where(
@@ -68,6 +139,22 @@ def list_authors(
     offset = (page - 1) * page_size
     statement = statement.offset(offset).limit(page_size)
 
+    if selected or included:
+        counts = author_count_columns(included)
+        items = []
+        for row in session.execute(statement.add_columns(*counts)):
+            if selected:
+                item = {name: row._mapping[name] for name in selected}
+            else:
+                item = AuthorRead.model_validate(row._mapping[Author]).model_dump()
+            item.update({column.name: row._mapping[column.name] for column in counts})
+            items.append(item)
+        if "books" in included:
+            books = books_by_author(session, [item["id"] for item in items])
+            for item in items:
+                item["books"] = books[item["id"]]
+        return sparse_page(items, total, page, page_size)
+
     authors = session.exec(statement).all()
 
     total_pages = (total + page_size - 1) // page_size
@@ -81,92 +168,152 @@ def list_authors(
     )
 
 
-@router.get("/{author_id}", response_model=AuthorWithBooks)
-def get_author(author_id: int, session: SessionDep):
-    author = session.get(Author, author_id)
-    if not author:
-        raise HTTPException(status_code=404, detail="Auteur non trouvé")
+def get_authors(session: Session, author_ids: list[int]) -> BatchResponse[AuthorRead]:
+    """Plusieurs auteurs en une requête `IN`, dans l'ordre demandé"""
+    authors = {
+        author.id: AuthorRead.model_validate(author)
+        for author in session.exec(select(Author).where(Author.id.in_(author_ids)))
+    }
+    return BatchResponse(
+        items=[authors[author_id] for author_id in author_ids if author_id in authors],
+        missing=[author_id for author_id in author_ids if author_id not in authors],
+    )
+
 
-    books_count = session.exec(
-        select(func.count()).where(Book.author_id == author_id)
-    ).one()
+@router.get(
+    "/{author_id}", response_model=AuthorWithBooks, response_model_exclude_unset=True
+)
+def get_author(
+    author_id: int,
+    session: SessionDep,
+    include: str | None = Query(None, description="Expansions : books, loans_count"),
+):
+    included = parse_include(include, ("books", "loans_count"))
+    counts = author_count_columns(["books_count", *included])
+    row = session.exec(select(Author, *counts).where(Author.id == author_id)).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Auteur non trouvé")
 
-    author_dict = author.model_dump()
-    author_dict["books_count"] = books_count
+    author_dict = row._mapping[Author].model_dump()
+    author_dict.update({column.name: row._mapping[column.name] for column in counts})
+    if "books" in included:
+        author_dict["books"] = books_by_author(session, [author_id])[author_id]
 
     return AuthorWithBooks(**author_dict)
 
 
 @router.patch("/{author_id}", response_model=AuthorRead)
-def update_author(author_id: int, author_update: AuthorUpdate, session: SessionDep):
-    db_author = session.get(Author, author_id)
-    if not db_author:
-        raise HTTPException(status_code=404, detail="Auteur non trouvé")
-
+def update_author(
+    author_id: int, author_update: AuthorUpdate, session: PrimarySessionDep
+):
     update_data = author_update.model_dump(exclude_unset=True)
 
-    if "first_name" in update_data or "last_name" in update_data:
-        first_name = update_data.get("first_name", db_author.first_name)
-        last_name = update_data.get("last_name", db_author.last_name)
+    def apply(session: Session) -> WriteResult:
+        db_author = session.get(Author, author_id)
+        if not db_author:
+            raise HTTPException(status_code=404, detail="Auteur non trouvé")
 
-        statement = select(Author).where(
-            Author.first_name == first_name,
-            Author.last_name == last_name,
-            Author.id != author_id,
-        )
-        existing = session.exec(statement).first()
-        if existing:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Un auteur avec le nom {first_name} {last_name} existe déjà",
+        if "first_name" in update_data or "last_name" in update_data:
+            first_name = update_data.get("first_name", db_author.first_name)
+            last_name = update_data.get("last_name", db_author.last_name)
+
+            statement = select(Author).where(
+                Author.first_name == first_name,
+                Author.last_name == last_name,
+                Author.id != author_id,
             )
+            existing = session.exec(statement).first()
+            if existing:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Un auteur avec le nom {first_name} {last_name}"
+                    + " existe déjà",
+                )
 
-    for key, value in update_data.items():
-        setattr(db_author, key, value)
+        for key, value in update_data.items():
+            setattr(db_author, key, value)
+
+        session.add(db_author)
+        session.flush()
+        updated = AuthorRead.model_validate(db_author)
+        return updated, lambda: index_author(updated)
+
+    return run_write(session, apply)
 
-    session.add(db_author)
-    session.commit()
-    session.refresh(db_author)
-    return db_author
+
+def books_in_other_branches(session: Session, author_id: int) -> int:
+    """Livres de l'auteur (commun à toutes) dans les autres succursales"""
+    count = 0
+    for bind in all_engines():
+        if bind is not session.bind:
+            with Session(bind) as other:
+                count += other.exec(
+                    select(func.count()).where(Book.author_id == author_id)
+                ).one()
+    return count
 
 
 @router.delete("/{author_id}", response_model=MessageResponse)
-def delete_author(author_id: int, session: SessionDep):
-    db_author = session.get(Author, author_id)
-    if not db_author:
-        raise HTTPException(status_code=404, detail="Auteur non trouvé")
+def delete_author(author_id: int, session: PrimarySessionDep):
+    def apply(session: Session) -> WriteResult:
+        db_author = session.get(Author, author_id)
+        if not db_author:
+            raise HTTPException(status_code=404, detail="Auteur non trouvé")
 
-    books_count = session.exec(
-        select(func.count()).where(Book.author_id == author_id)
-    ).one()
+        books_count = session.exec(
+            select(func.count()).where(Book.author_id == author_id)
+        ).one() + books_in_other_branches(session, author_id)
 
-    if books_count > 0:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Impossible de supprimer l'auteur car il a {books_count}"
-            + "livre(s) associé(s)",
+        if books_count > 0:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Impossible de supprimer l'auteur car il a {books_count}"
+                + "livre(s) associé(s)",
+            )
+
+        session.delete(db_author)
+        response = MessageResponse(
+            message="Auteur supprimé avec succès",
+            detail=f"L'auteur {db_author.first_name} {db_author.last_name}"
+            + " a été supprimé",
         )
+        return response, lambda: unindex("author", author_id)
 
-    session.delete(db_author)
-    session.commit()
-    return MessageResponse(
-        message="Auteur supprimé avec succès",
-        detail=f"L'auteur {db_author.first_name} {db_author.last_name} a été supprimé",
-    )
+    return run_write(session, apply)
 
 
 @router.get("/search/name", response_model=list[AuthorRead])
 def search_author_by_name(
     name: str = Query(..., min_length=2, description="Prénom ou nom à rechercher"),
     session: SessionDep = None,
+    fuzzy: bool = Query(False, description="Tolérer les fautes de frappe"),
 ):
-    statement = select(Author).where(
-        (Author.first_name.ilike(f"%{name}%")) | (Author.last_name.ilike(f"%{name}%"))
-    )
-
-    results = session.exec(statement).all()
+    """Auteurs dont le prénom ou le nom contient `name`, envoyés en flux"""
+    if fuzzy:
+        matches = fuzzy_index.search(name, "author", limit=settings.MAX_PAGE_SIZE)
+        author_ids = [author_id for author_id, _, _ in matches]
+        authors = {
+            author.id: author
+            for author in session.exec(
+                select(Author).where(Author.id.in_(author_ids))
+            ).all()
+        }
+        results = [
+            authors[author_id] for author_id in author_ids if author_id in authors
+        ]
+    else:
+        statement = (
+            select(Author)
+            .where(
+                (Author.first_name.ilike(f"%{name}%"))
+                | (Author.last_name.ilike(f"%{name}%"))
+            )
+            .execution_options(yield_per=settings.STREAM_YIELD_PER)
+        )
+        results = session.exec(statement)
 
-    if not results:
+    rows = peek(results)
+    if rows is None:
         raise HTTPException(status_code=404, detail="Aucun auteur trouvé avec ce nom")
 
-    return results
+    return stream_json_array(AuthorRead.model_validate(author) for author in rows)
@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Query
+
+from app.core.search_index import autocomplete_index
+from app.schemas.common import AutocompleteSuggestion
+
+router = APIRouter(prefix="/autocomplete", tags=["Search"])
+
+
+@router.get("", response_model=list[AutocompleteSuggestion])
+def autocomplete(
+    q: str = Query(..., min_length=1, description="Début du titre ou du nom"),
+    limit: int = Query(10, ge=1, le=50),
+):
+    """Suggérer titres et auteurs commençant par `q` (accents et casse ignorés)"""
+    return [
+        AutocompleteSuggestion(kind=kind, id=item_id, label=label)
+        for kind, item_id, label in autocomplete_index.search(q, limit)
+    ]
@@ -1,18 +1,136 @@
-from typing import Optional
+from typing import Iterator, Optional
 
 from fastapi import APIRouter, HTTPException, Query
-from sqlmodel import func, or_, select
-
-from app.core.database import SessionDep
+from sqlmodel import Session, case, func, or_, select
+
+from app.core.catalog import CatalogMatch, catalog
+from app.core.config import settings
+from app.core.database import SessionDep, on_primary_database, shared_session
+from app.core.fields import parse_fields, parse_ids, sparse_page
+from app.core.search_index import fuzzy_index, index_book, unindex
+from app.core.streaming import peek, stream_json_array
+from app.core.write_queue import WriteResult, run_write
 from app.models.author import Author
 from app.models.book import Book, BookCategory
+from app.models.bookCooccurrence import BookCooccurrence
 from app.models.loan import Loan, LoanStatus
-from app.schemas.book import BookCreate, BookRead, BookReadWithAuthor, BookUpdate
-from app.schemas.common import MessageResponse, PaginatedResponse
+from app.schemas.book import (
+    BookCreate,
+    BookRead,
+    BookReadWithAuthor,
+    BookSearchResponse,
+    BookUpdate,
+    RelatedBookRead,
+)
+from app.schemas.common import BatchResponse, MessageResponse, PaginatedResponse
 
 router = APIRouter(prefix="/books", tags=["Books"])
 
 
+def book_columns(selected: list[str]) -> list:
+    """Colonnes SQL correspondant aux champs demandés de `BookReadWithAuthor`"""
+    columns = []
+    for name in selected:
+        if name == "author_name":
+            columns.append(
+                (Author.first_name + " " + Author.last_name).label("author_name")
+            )
+        elif name == "loans_count":
+            columns.append(
+                select(func.count())
+                .where(Loan.book_id == Book.id)
+                .correlate(Book)
+                .scalar_subquery()
+                .label("loans_count")
+            )
+        else:
+            columns.append(getattr(Book, name))
+    return columns
+
+
+# Sans `fields`, author_name et loans_count sont calculés dans la même requête
+ALL_BOOK_FIELDS = list(BookReadWithAuthor.model_fields)
+
+FACET_COLUMNS = {
+    "category": Book.category,
+    "language": Book.language,
+    "decade": (Book.publication_year // 10) * 10,
+}
+
+
+def catalog_page(statement, matched: CatalogMatch, page: int, page_size: int):
+    """Restreint `statement` à une page des livres filtrés par le catalogue"""
+    page_ids = matched.page((page - 1) * page_size, page * page_size)
+    return statement.where(Book.id.in_(page_ids)).order_by(Book.id)
+
+
+def catalog_rows(session: Session, statement, matched: CatalogMatch) -> Iterator:
+    """Lignes complètes des livres filtrés, chargées par lots pour le flux"""
+    for chunk in matched.chunks(settings.STREAM_YIELD_PER):
+        yield from session.exec(
+            statement.where(Book.id.in_(chunk)).order_by(Book.id)
+        ).all()
+
+
+def parse_facets(facets: Optional[str]) -> list[str]:
+    """Découpe `facets=a,b` et vérifie que chaque facette est connue"""
+    if not facets:
+        return []
+    names = [name.strip() for name in facets.split(",") if name.strip()]
+    names = list(dict.fromkeys(names))
+    unknown = [name for name in names if name not in FACET_COLUMNS]
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Facettes inconnues : {', '.join(unknown)}"
+        )
+    return names
+
+
+def count_facets(
+    session: Session, statement, names: list[str]
+) -> Optional[dict[str, dict[str, int]]]:
+    """
+    Compte les livres par valeur de facette pour les filtres courants.
+
+    Une seule requête groupée sur la combinaison des facettes demandées, puis
+    les comptes de chaque facette sont obtenus en sommant ses lignes.
+    """
+    if not names:
+        return None
+
+    columns = [FACET_COLUMNS[name].label(name) for name in names]
+    grouped = statement.with_only_columns(*columns, func.count()).order_by(None)
+    rows = session.exec(grouped.group_by(*columns)).all()
+
+    counts: dict[str, dict[str, int]] = {name: {} for name in names}
+    for row in rows:
+        *values, count = row
+        for name, value in zip(names, values):
+            key = str(value.value if isinstance(value, BookCategory) else value)
+            counts[name][key] = counts[name].get(key, 0) + count
+    return {
+        name: dict(sorted(values.items(), key=lambda item: (-item[1], item[0])))
+        for name, values in counts.items()
+    }
+
+
+def reindex_book(book: BookRead) -> None:
+    # Index flou et autocomplétion ne couvrent que les livres de la base principale
+    if on_primary_database():
+        index_book(book)
+
+
+def unindex_book(book_id: int) -> None:
+    if on_primary_database():
+        unindex("book", book_id)
+
+
+def fuzzy_ids(query: str, kind: str) -> list[int]:
+    """Ids les plus proches de `query` dans l'index de trigrammes, par similarité"""
+    matches = fuzzy_index.search(query, kind, limit=settings.MAX_PAGE_SIZE)
+    return [item_id for item_id, _, _ in matches]
+
+
 @router.post(
     "/", response_model=BookRead, status_code=201
 )  # décorateur, fastapi ne renverra que ceux qu'il y a dans le BookRead
@@ -20,28 +138,54 @@ def create_book(
     book: BookCreate, session: SessionDep
 ):  # fonction, injection de dependence avec le sessionDep
 
-    # vérification de l'unicité du book
-    statement = select(Book).where(Book.isbn == book.isbn)
-    existing = session.exec(statement).first()
-    if existing:
-        raise HTTPException(
-            status_code=400, detail=f"Un livre avec l'ISBN {book.isbn} existe déjà"
-        )
+    def apply(session: Session) -> WriteResult:
+        # vérification de l'unicité du book
+        statement = select(Book).where(Book.isbn == book.isbn)
+        existing = session.exec(statement).first()
+        if existing:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Un livre avec l'ISBN {book.isbn} existe déjà",
+            )
 
-    # vérification si l'auteur existe ou pas
-    author = session.get(Author, book.author_id)
-    if not author:
-        raise HTTPException(status_code=404, detail="Auteur non trouvé")
+        # vérification si l'auteur existe ou pas (base commune)
+        with shared_session(session) as authors:
+            author = authors.get(Author, book.author_id)
+        if not author:
+            raise HTTPException(status_code=404, detail="Auteur non trouvé")
 
-    # si tout est bon je créer mon livre
-    db_book = Book.model_validate(book)
-    session.add(db_book)
-    session.commit()
-    session.refresh(db_book)
-    return db_book
+        # si tout est bon je créer mon livre
+        db_book = Book.model_validate(book)
+        session.add(db_book)
+        session.flush()
+        created = BookRead.model_validate(db_book)
+        return created, lambda: reindex_book(created)
 
+    return run_write(session, apply)
 
-@router.get("/search", response_model=PaginatedResponse[BookReadWithAuthor])
+
+@router.get("/", response_model=BatchResponse[BookReadWithAuthor])
+def get_books(
+    session: SessionDep,
+    ids: str = Query(..., description="Identifiants séparés par des virgules"),
+):
+    """Plusieurs livres en une requête, dans l'ordre demandé"""
+    book_ids = parse_ids(ids)
+    statement = (
+        select(*book_columns(ALL_BOOK_FIELDS))
+        .join(Author, Book.author_id == Author.id)
+        .where(Book.id.in_(book_ids))
+    )
+    books = {
+        row.id: BookReadWithAuthor(**row._mapping) for row in session.exec(statement)
+    }
+    return BatchResponse(
+        items=[books[book_id] for book_id in book_ids if book_id in books],
+        missing=[book_id for book_id in book_ids if book_id not in books],
+    )
+
+
+@router.get("/search", response_model=BookSearchResponse)
 def search_books(
     session: SessionDep,
     page: int = Query(1, ge=1),
@@ -50,12 +194,43 @@ def search_books(
     author_name: Optional[str] = None,
     category: Optional[BookCategory] = None,
     available_only: bool = False,
+    fields: Optional[str] = Query(
+        None, description="Champs à renvoyer, séparés par des virgules"
+    ),
+    fuzzy: bool = Query(
+        False, description="Titre et auteur tolérants aux fautes de frappe"
+    ),
+    facets: Optional[str] = Query(
+        None, description="Facettes à compter : category, language, decade"
+    ),
 ):
-    statement = select(Book, Author).join(Author, Book.author_id == Author.id)
+    facet_names = parse_facets(facets)
+    selected = parse_fields(fields, BookReadWithAuthor)
+    columns = book_columns(selected or ALL_BOOK_FIELDS)
+    statement = select(*columns).join(Author, Book.author_id == Author.id)
+
+    # Catalogue en mémoire et index flou des titres : base principale seulement
+    primary = on_primary_database()
+    if catalog.loaded and primary and not (title or author_name or facet_names):
+        matched = catalog.match(category=category, available_only=available_only)
+        total = len(matched)
+        facet_counts = count_facets(session, statement, facet_names)
+        statement = catalog_page(statement, matched, page, page_size)
+        return book_search_page(
+            session, statement, selected, total, page, page_size, facet_counts
+        )
 
-    if title:
+    if title and fuzzy and primary:
+        book_ids = fuzzy_ids(title, "book")
+        statement = statement.where(Book.id.in_(book_ids))
+        if book_ids:
+            ranks = {book_id: rank for rank, book_id in enumerate(book_ids)}
+            statement = statement.order_by(case(ranks, value=Book.id))
+    elif title:
         statement = statement.where(Book.title.ilike(f"%{title}%"))
-    if author_name:
+    if author_name and fuzzy:
+        statement = statement.where(Author.id.in_(fuzzy_ids(author_name, "author")))
+    elif author_name:
         statement = statement.where(
             or_(
                 Author.first_name.ilike(f"%{author_name}%"),
@@ -68,71 +243,92 @@ def search_books(
         statement = statement.where(Book.available_copies > 0)
 
     total = session.exec(select(func.count()).select_from(statement.subquery())).one()
-    results = session.exec(
-        statement.offset((page - 1) * page_size).limit(page_size)
-    ).all()
-
-    books_with_authors = []
-    for book, author in results:
-        loans_count = session.exec(
-            select(func.count()).where(Loan.book_id == book.id)
-        ).one()
-        book_dict = book.model_dump()
-        book_dict["author_name"] = f"{author.first_name} {author.last_name}"
-        book_dict["loans_count"] = loans_count
-        books_with_authors.append(BookReadWithAuthor(**book_dict))
+    facet_counts = count_facets(session, statement, facet_names)
+    statement = statement.offset((page - 1) * page_size).limit(page_size)
+    return book_search_page(
+        session, statement, selected, total, page, page_size, facet_counts
+    )
 
-    return PaginatedResponse(
+
+def book_search_page(
+    session: Session,
+    statement,
+    selected: Optional[list[str]],
+    total: int,
+    page: int,
+    page_size: int,
+    facet_counts: dict,
+):
+    if selected:
+        rows = session.execute(statement).mappings().all()
+        return sparse_page(
+            [dict(row) for row in rows], total, page, page_size, facets=facet_counts
+        )
+
+    books_with_authors = [
+        BookReadWithAuthor(**row._mapping) for row in session.exec(statement)
+    ]
+
+    return BookSearchResponse(
         items=books_with_authors,
         total=total,
         page=page,
         page_size=page_size,
         total_pages=(total + page_size - 1) // page_size,
+        facets=facet_counts,
     )
 
 
 @router.patch("/{book_id}", response_model=BookRead)
 def update_book(book_id: int, book_update: BookUpdate, session: SessionDep):
-    db_book = session.get(Book, book_id)
-    if not db_book:
-        raise HTTPException(status_code=404, detail="Livre non trouvé")
-
     update_data = book_update.model_dump(exclude_unset=True)
 
-    available = update_data.get("available_copies", db_book.available_copies)
-    total = update_data.get("total_copies", db_book.total_copies)
-    if available > total:
-        raise HTTPException(status_code=400, detail="Disponibles > Total impossible")
+    def apply(session: Session) -> WriteResult:
+        db_book = session.get(Book, book_id)
+        if not db_book:
+            raise HTTPException(status_code=404, detail="Livre non trouvé")
 
-    for key, value in update_data.items():
-        setattr(db_book, key, value)
+        available = update_data.get("available_copies", db_book.available_copies)
+        total = update_data.get("total_copies", db_book.total_copies)
+        if available > total:
+            raise HTTPException(
+                status_code=400, detail="Disponibles > Total impossible"
+            )
+
+        for key, value in update_data.items():
+            setattr(db_book, key, value)
+
+        session.add(db_book)
+        session.flush()
+        updated = BookRead.model_validate(db_book)
+        return updated, lambda: reindex_book(updated)
 
-    session.add(db_book)
-    session.commit()
-    session.refresh(db_book)
-    return db_book
+    return run_write(session, apply)
 
 
 @router.delete("/{book_id}", response_model=MessageResponse)
 def delete_book(book_id: int, session: SessionDep):
-    db_book = session.get(Book, book_id)
-    if not db_book:
-        raise HTTPException(status_code=404, detail="Livre non trouvé")
+    def apply(session: Session) -> WriteResult:
+        db_book = session.get(Book, book_id)
+        if not db_book:
+            raise HTTPException(status_code=404, detail="Livre non trouvé")
+
+        active_loans = session.exec(
+            select(func.count()).where(
+                Loan.book_id == book_id,
+                or_(Loan.status == LoanStatus.ACTIVE, Loan.status == LoanStatus.LATE),
+            )
+        ).one()
+        if active_loans > 0:
+            raise HTTPException(
+                status_code=400, detail="Emprunts en cours, suppression impossible"
+            )
 
-    active_loans = session.exec(
-        select(func.count()).where(
-            Loan.book_id == book_id,
-            or_(Loan.status == LoanStatus.ACTIVE, Loan.status == LoanStatus.LATE),
-        )
-    ).one()
-    if active_loans > 0:
-        raise HTTPException(
-            status_code=400, detail="Emprunts en cours, suppression impossible"
-        )
+        session.delete(db_book)
+        response = MessageResponse(message="Livre supprimé")
+        return response, lambda: unindex_book(book_id)
 
-    session.delete(db_book)
-    session.commit()
-    return MessageResponse(message="Livre supprimé")
+    return run_write(session, apply)
 
 
 @router.get("/search-by-isbn", response_model=BookReadWithAuthor)
@@ -170,31 +366,39 @@ def search_books_by_year(
     ),
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    fields: Optional[str] = Query(
+        None, description="Champs à renvoyer, séparés par des virgules"
+    ),
 ):
-    statement = select(Book, Author).join(Author, Book.author_id == Author.id)
+    selected = parse_fields(fields, BookReadWithAuthor)
+    columns = book_columns(selected or ALL_BOOK_FIELDS)
+    statement = select(*columns).join(Author, Book.author_id == Author.id)
 
     if year_exact:
-        statement = statement.where(Book.publication_year == year_exact)
+        year_min = year_max = year_exact
+
+    if catalog.loaded and on_primary_database():
+        matched = catalog.match(year_min=year_min or None, year_max=year_max or None)
+        total = len(matched)
+        statement = catalog_page(statement, matched, page, page_size)
     else:
         if year_min:
             statement = statement.where(Book.publication_year >= year_min)
         if year_max:
             statement = statement.where(Book.publication_year <= year_max)
 
-    total = session.exec(select(func.count()).select_from(statement.subquery())).one()
-    results = session.exec(
-        statement.offset((page - 1) * page_size).limit(page_size)
-    ).all()
-
-    books_with_authors = []
-    for book, author in results:
-        loans_count = session.exec(
-            select(func.count()).where(Loan.book_id == book.id)
+        total = session.exec(
+            select(func.count()).select_from(statement.subquery())
         ).one()
-        book_dict = book.model_dump()
-        book_dict["author_name"] = f"{author.first_name} {author.last_name}"
-        book_dict["loans_count"] = loans_count
-        books_with_authors.append(BookReadWithAuthor(**book_dict))
+        statement = statement.offset((page - 1) * page_size).limit(page_size)
+
+    if selected:
+        rows = session.execute(statement).mappings().all()
+        return sparse_page([dict(row) for row in rows], total, page, page_size)
+
+    books_with_authors = [
+        BookReadWithAuthor(**row._mapping) for row in session.exec(statement)
+    ]
 
     return PaginatedResponse(
         items=books_with_authors,
@@ -207,28 +411,48 @@ def search_books_by_year(
 
 @router.get("/search-books-by-iso/{iso}", response_model=list[BookReadWithAuthor])
 def get_books_by_language(iso: str, session: SessionDep):
-    statement = (
-        select(Book, Author)
-        .join(Author, Book.author_id == Author.id)
-        .where(Book.language.ilike(iso.strip()))
+    """Livres d'une langue, envoyés en flux au fil du curseur"""
+    statement = select(*book_columns(ALL_BOOK_FIELDS)).join(
+        Author, Book.author_id == Author.id
     )
-
-    results = session.exec(statement).all()
-
-    if not results:
+    # `ilike` sans joker est une égalité insensible à la casse, comme le catalogue
+    if catalog.loaded and on_primary_database() and not {"%", "_"} & set(iso):
+        rows = peek(
+            catalog_rows(session, statement, catalog.match(language=iso.strip()))
+        )
+    else:
+        statement = (
+            statement.where(Book.language.ilike(iso.strip()))
+            .order_by(Book.id)
+            .execution_options(yield_per=settings.STREAM_YIELD_PER)
+        )
+        rows = peek(session.exec(statement))
+    if rows is None:
         raise HTTPException(
             status_code=404, detail=f"Aucun livre trouvé pour la langue : {iso}"
         )
 
-    books_with_authors = []
-    for book, author in results:
-        loans_count = session.exec(
-            select(func.count()).where(Loan.book_id == book.id)
-        ).one()
+    return stream_json_array(BookReadWithAuthor(**row._mapping) for row in rows)
+
 
-        book_dict = book.model_dump()
-        book_dict["author_name"] = f"{author.first_name} {author.last_name}"
-        book_dict["loans_count"] = loans_count
-        books_with_authors.append(BookReadWithAuthor(**book_dict))
+@router.get("/{book_id}/related", response_model=list[RelatedBookRead])
+def get_related_books(
+    book_id: int,
+    session: SessionDep,
+    limit: int = Query(10, ge=1, le=50),
+):
+    """Livres empruntés par les mêmes lecteurs, du plus fréquent au moins fréquent"""
+    if not session.get(Book, book_id):
+        raise HTTPException(status_code=404, detail="Livre non trouvé")
 
-    return books_with_authors
+    statement = (
+        select(Book, BookCooccurrence.co_loans)
+        .join(BookCooccurrence, BookCooccurrence.related_book_id == Book.id)
+        .where(BookCooccurrence.book_id == book_id)
+        .order_by(BookCooccurrence.co_loans.desc())
+        .limit(limit)
+    )
+    return [
+        RelatedBookRead(**book.model_dump(), co_loans=co_loans)
+        for book, co_loans in session.exec(statement).all()
+    ]
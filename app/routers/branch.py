@@ -0,0 +1,94 @@
+import asyncio
+import heapq
+from itertools import islice
+from typing import Optional
+
+from fastapi import APIRouter, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import Engine
+from sqlmodel import Session, or_, select
+
+from app.core.config import settings
+from app.core.database import branch_engines, engine
+from app.models.author import Author
+from app.models.book import Book, BookCategory
+from app.routers.book import ALL_BOOK_FIELDS, book_columns
+from app.schemas.book import BookReadWithAuthor, BranchBookRead
+
+router = APIRouter(tags=["Branches"])
+
+
+@router.get("/branches", response_model=list[str])
+def list_branches():
+    """Succursales servies, la base principale en premier"""
+    return [settings.DEFAULT_BRANCH, *branch_engines]
+
+
+def search_branch(
+    bind: Engine,
+    title: Optional[str],
+    author_name: Optional[str],
+    category: Optional[BookCategory],
+    available_only: bool,
+    limit: int,
+) -> list[BookReadWithAuthor]:
+    """Premiers livres d'une succursale par titre, avec sa propre session"""
+    statement = select(*book_columns(ALL_BOOK_FIELDS)).join(
+        Author, Book.author_id == Author.id
+    )
+    if title:
+        statement = statement.where(Book.title.ilike(f"%{title}%"))
+    if author_name:
+        statement = statement.where(
+            or_(
+                Author.first_name.ilike(f"%{author_name}%"),
+                Author.last_name.ilike(f"%{author_name}%"),
+            )
+        )
+    if category:
+        statement = statement.where(Book.category == category)
+    if available_only:
+        statement = statement.where(Book.available_copies > 0)
+    statement = statement.order_by(Book.title, Book.id).limit(limit)
+
+    with Session(bind) as session:
+        return [BookReadWithAuthor(**row._mapping) for row in session.exec(statement)]
+
+
+@router.get("/books/search-branches", response_model=list[BranchBookRead])
+async def search_all_branches(
+    title: Optional[str] = None,
+    author_name: Optional[str] = None,
+    category: Optional[BookCategory] = None,
+    available_only: bool = False,
+    limit: int = Query(20, ge=1, le=100),
+):
+    """
+    Chercher dans le catalogue de toutes les succursales à la fois.
+
+    Chaque base est interrogée en parallèle (une par thread) pour ses `limit`
+    premiers titres ; les listes, déjà triées, sont fusionnées par titre.
+    """
+    branches = {settings.DEFAULT_BRANCH: engine, **branch_engines}
+    results = await asyncio.gather(
+        *(
+            run_in_threadpool(
+                search_branch,
+                bind,
+                title,
+                author_name,
+                category,
+                available_only,
+                limit,
+            )
+            for bind in branches.values()
+        )
+    )
+    merged = heapq.merge(
+        *(
+            [BranchBookRead(**book.model_dump(), branch=branch) for book in books]
+            for branch, books in zip(branches, results)
+        ),
+        key=lambda book: (book.title, book.branch, book.id),
+    )
+    return list(islice(merged, limit))
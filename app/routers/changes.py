@@ -0,0 +1,52 @@
+from fastapi import APIRouter, HTTPException, Query
+from sqlmodel import select
+
+from app.core.changefeed import latest_change_id, pruned_through
+from app.core.config import settings
+from app.core.database import SessionDep
+from app.models.change import Change
+from app.schemas.change import ChangeFeedResponse, ChangeTokenResponse
+
+router = APIRouter(prefix="/changes", tags=["Changes"])
+
+
+@router.get("", response_model=ChangeFeedResponse)
+def list_changes(
+    session: SessionDep,
+    since: int = Query(0, ge=0, description="Jeton renvoyé par l'appel précédent"),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """
+    Renvoyer les modifications postérieures au jeton `since`, dans l'ordre.
+
+    Un jeton plus ancien que la rétention du journal (0 compris, une fois le
+    journal purgé) renvoie 410 : le consommateur doit alors refaire un export
+    complet, puis repartir du jeton de `/changes/token`.
+    """
+    if since < pruned_through(session):
+        raise HTTPException(
+            status_code=410,
+            detail=f"Jeton expiré (rétention {settings.CHANGES_RETENTION_DAYS} jours)"
+            + " : resynchronisation complète nécessaire",
+        )
+
+    changes = session.exec(
+        select(Change).where(Change.id > since).order_by(Change.id).limit(limit + 1)
+    ).all()
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    return ChangeFeedResponse(
+        changes=changes,
+        next_token=changes[-1].id if changes else since,
+        has_more=has_more,
+    )
+
+
+@router.get("/token", response_model=ChangeTokenResponse)
+def get_change_token(session: SessionDep):
+    """
+    Jeton courant du flux, à lire avant un export complet : les modifications
+    faites pendant l'export seront renvoyées par `/changes?since=<jeton>`.
+    """
+    return ChangeTokenResponse(next_token=latest_change_id(session))
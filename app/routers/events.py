@@ -0,0 +1,50 @@
+import asyncio
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import StreamingResponse
+
+from app.core.config import settings
+from app.core.events import broker
+
+router = APIRouter(prefix="/events", tags=["Events"])
+
+
+@router.get("/stream")
+async def stream_events(
+    request: Request,
+    book_id: Optional[int] = Query(None, description="Suivre un seul livre"),
+    library_card_number: Optional[str] = Query(
+        None, description="Suivre un seul lecteur"
+    ),
+):
+    """
+    Flux SSE des emprunts, retours, renouvellements et changements de
+    disponibilité, à la place d'un polling de `list_loans`.
+    """
+    subscription = broker.subscribe(book_id, library_card_number)
+
+    async def event_source():
+        try:
+            yield ": connecté\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        subscription.queue.get(),
+                        timeout=settings.EVENTS_KEEPALIVE_SECONDS,
+                    )
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
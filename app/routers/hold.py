@@ -0,0 +1,109 @@
+from fastapi import APIRouter, HTTPException
+from sqlmodel import Session, func, select
+
+from app.core.config import settings
+from app.core.database import SessionDep
+from app.core.write_queue import WriteResult, run_write
+from app.models.book import Book
+from app.models.hold import Hold, HoldStatus
+from app.routers.loan import count_active_loans, has_active_loan
+from app.schemas.common import MessageResponse
+from app.schemas.hold import HoldCreate, HoldRead
+
+router = APIRouter(tags=["Holds"])
+
+
+@router.post("/books/{book_id}/holds", response_model=HoldRead, status_code=201)
+def create_hold(book_id: int, hold: HoldCreate, session: SessionDep):
+    """Réserver un livre indisponible (file d'attente FIFO)"""
+
+    def apply(session: Session) -> WriteResult:
+        book = session.get(Book, book_id)
+        if not book:
+            raise HTTPException(status_code=404, detail="Livre non trouvé")
+
+        if book.available_copies > 0:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Le livre '{book.title}' est disponible, "
+                "empruntez-le directement",
+            )
+
+        # Une réservation est servie par un emprunt : refusée d'avance si cet
+        # emprunt serait lui-même refusé
+        if count_active_loans(session, hold.borrower_email) >= (
+            settings.MAX_LOANS_PER_USER
+        ):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Limite d'emprunts atteinte ({settings.MAX_LOANS_PER_USER}"
+                + " maximum)",
+            )
+
+        if has_active_loan(session, hold.borrower_email, book_id):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Le livre '{book.title}' est déjà emprunté par ce lecteur",
+            )
+
+        existing = session.exec(
+            select(Hold).where(
+                Hold.book_id == book_id,
+                Hold.status == HoldStatus.WAITING,
+                Hold.library_card_number == hold.library_card_number,
+            )
+        ).first()
+        if existing:
+            raise HTTPException(
+                status_code=400,
+                detail="Une réservation est déjà en attente pour ce livre",
+            )
+
+        db_hold = Hold(book_id=book_id, **hold.model_dump())
+        session.add(db_hold)
+        session.flush()
+
+        position = session.exec(
+            select(func.count()).where(
+                Hold.book_id == book_id,
+                Hold.status == HoldStatus.WAITING,
+                Hold.id <= db_hold.id,
+            )
+        ).one()
+        return HoldRead(**db_hold.model_dump(), position=position), None
+
+    return run_write(session, apply)
+
+
+@router.get("/books/{book_id}/holds", response_model=list[HoldRead])
+def list_holds(book_id: int, session: SessionDep):
+    """Lister la file d'attente d'un livre, de la tête à la queue"""
+    holds = session.exec(
+        select(Hold)
+        .where(Hold.book_id == book_id, Hold.status == HoldStatus.WAITING)
+        .order_by(Hold.id)
+    ).all()
+    return [
+        HoldRead(**hold.model_dump(), position=position)
+        for position, hold in enumerate(holds, start=1)
+    ]
+
+
+@router.delete("/holds/{hold_id}", response_model=MessageResponse)
+def cancel_hold(hold_id: int, session: SessionDep):
+    def apply(session: Session) -> WriteResult:
+        hold = session.get(Hold, hold_id)
+        if not hold:
+            raise HTTPException(status_code=404, detail="Réservation non trouvée")
+
+        if hold.status != HoldStatus.WAITING:
+            raise HTTPException(
+                status_code=400,
+                detail="Seule une réservation en attente peut être annulée",
+            )
+
+        hold.status = HoldStatus.CANCELLED
+        session.add(hold)
+        return MessageResponse(message="Réservation annulée"), None
+
+    return run_write(session, apply)
@@ -2,13 +2,25 @@ from datetime import datetime, timedelta
 from typing import Optional
 
 from fastapi import APIRouter, HTTPException, Query
-from sqlmodel import func, or_, select
+from sqlalchemy import and_, literal, union_all
+from sqlmodel import Session, func, or_, select
 
 from app.core.config import settings
 from app.core.database import SessionDep
+from app.core.events import publish_loan_event
+from app.core.fields import parse_fields, parse_ids, sparse_page
+from app.core.idempotency import (
+    IdempotencyKeyHeader,
+    remember_response,
+    run_idempotent_write,
+)
+from app.core.recommendations import record_co_borrowing
+from app.core.write_queue import run_write
 from app.models.book import Book
+from app.models.hold import Hold, HoldStatus
 from app.models.loan import Loan, LoanStatus
-from app.schemas.common import PaginatedResponse
+from app.models.loanHistory import LoanHistory
+from app.schemas.common import BatchResponse, PaginatedResponse
 from app.schemas.loan import (
     LoanCreate,
     LoanRead,
@@ -38,19 +50,136 @@ def calculate_penalty(due_date: datetime, return_date: datetime) -> tuple[float,
     return round(penalty, 2), days_late
 
 
+def loan_status(due_date: datetime, return_date: Optional[datetime]) -> LoanStatus:
+    """Calcule le statut d'un emprunt en fonction de la date"""
+    if return_date:
+        return LoanStatus.RETURNED
+    if datetime.now() > due_date:
+        return LoanStatus.LATE
+    return LoanStatus.ACTIVE
+
+
 def update_loan_status(loan: Loan) -> None:
     """Met à jour le statut d'un emprunt en fonction de la date"""
-    if loan.return_date:
-        loan.status = LoanStatus.RETURNED
-    elif datetime.now() > loan.due_date:
-        loan.status = LoanStatus.LATE
-    else:
-        loan.status = LoanStatus.ACTIVE
+    loan.status = loan_status(loan.due_date, loan.return_date)
 
 
-@router.post("/", response_model=LoanRead, status_code=201)
-def create_loan(loan: LoanCreate, session: SessionDep):
-    """Créer un nouvel emprunt"""
+def new_loan(
+    book_id: int,
+    borrower_name: str,
+    borrower_email: str,
+    library_card_number: str,
+    comments: Optional[str] = None,
+) -> Loan:
+    """Construit un emprunt actif qui commence maintenant"""
+    now = datetime.now()
+    return Loan(
+        book_id=book_id,
+        borrower_name=borrower_name,
+        borrower_email=borrower_email,
+        library_card_number=library_card_number,
+        loan_date=now,
+        due_date=now + timedelta(days=settings.LOAN_DURATION_DAYS),
+        status=LoanStatus.ACTIVE,
+        comments=comments,
+    )
+
+
+def active_loans_filter(borrower_email):
+    """Condition SQL : emprunts en cours (actifs ou en retard) d'un lecteur"""
+    return and_(
+        Loan.borrower_email == borrower_email,
+        or_(Loan.status == LoanStatus.ACTIVE, Loan.status == LoanStatus.LATE),
+    )
+
+
+def count_active_loans(session: Session, borrower_email: str) -> int:
+    return session.exec(
+        select(func.count()).where(active_loans_filter(borrower_email))
+    ).one()
+
+
+def has_active_loan(session: Session, borrower_email: str, book_id: int) -> bool:
+    return (
+        session.exec(
+            select(Loan.id).where(
+                active_loans_filter(borrower_email), Loan.book_id == book_id
+            )
+        ).first()
+        is not None
+    )
+
+
+def holders_loans(
+    session: Session, emails: list[str], book_id: int
+) -> dict[str, tuple[int, bool]]:
+    """Emprunts en cours de plusieurs lecteurs : (nombre, a déjà ce livre)"""
+    rows = session.exec(
+        select(
+            Loan.borrower_email,
+            func.count(),
+            func.max(Loan.book_id == book_id),
+        )
+        .where(
+            Loan.borrower_email.in_(emails),
+            or_(Loan.status == LoanStatus.ACTIVE, Loan.status == LoanStatus.LATE),
+        )
+        .group_by(Loan.borrower_email)
+    ).all()
+    return {email: (count, bool(has_book)) for email, count, has_book in rows}
+
+
+def assign_to_next_hold(session: Session, book: Book) -> Optional[Loan]:
+    """
+    Attribue un exemplaire rendu à la première réservation servable de la file.
+
+    Les `HOLD_MAX_SKIPS` + 1 premières réservations en attente sont lues en
+    tête de file via l'index (book_id, status, id), et leurs emprunts en cours
+    en une requête groupée ; l'éligibilité est vérifiée ici. Un réservataire
+    déjà à `MAX_LOANS_PER_USER` emprunts, ou qui a déjà ce livre, est sauté :
+    sa réservation garde sa place pour un prochain retour. Au-delà de
+    `HOLD_MAX_SKIPS` réservations sautées, ou sans réservation servable,
+    l'exemplaire redevient disponible : un retour coûte au plus deux requêtes
+    bornées, quelle que soit la longueur de la file. Ne commit pas :
+    l'appelant garde une seule transaction.
+
+    Returns:
+        Le nouvel emprunt créé pour le réservataire, ou None
+    """
+    heads = session.exec(
+        select(Hold)
+        .where(Hold.book_id == book.id, Hold.status == HoldStatus.WAITING)
+        .order_by(Hold.id)
+        .limit(settings.HOLD_MAX_SKIPS + 1)
+    ).all()
+    loans = holders_loans(session, [head.borrower_email for head in heads], book.id)
+    hold = None
+    for head in heads:
+        count, has_book = loans.get(head.borrower_email, (0, False))
+        if count < settings.MAX_LOANS_PER_USER and not has_book:
+            hold = head
+            break
+    if not hold:
+        book.available_copies += 1
+        session.add(book)
+        return None
+
+    record_co_borrowing(session, hold.library_card_number, book.id)
+    loan = new_loan(
+        book.id, hold.borrower_name, hold.borrower_email, hold.library_card_number
+    )
+    session.add(loan)
+    session.flush()
+
+    hold.status = HoldStatus.FULFILLED
+    hold.loan_id = loan.id
+    hold.fulfilled_at = loan.loan_date
+    session.add(hold)
+    return loan
+
+
+def apply_create_loan(session: Session, loan: LoanCreate, idempotency_key):
+    """Crée l'emprunt sans commit ; renvoie (réponse, publication après commit)"""
     book = session.get(Book, loan.book_id)
     if not book:
         raise HTTPException(status_code=404, detail="Livre non trouvé")
@@ -61,12 +190,7 @@ def create_loan(loan: LoanCreate, session: SessionDep):
             detail=f"Le livre '{book.title}' n'est pas disponible actuellement",
         )
 
-    active_loans = session.exec(
-        select(func.count()).where(
-            Loan.borrower_email == loan.borrower_email,
-            or_(Loan.status == LoanStatus.ACTIVE, Loan.status == LoanStatus.LATE),
-        )
-    ).one()
+    active_loans = count_active_loans(session, loan.borrower_email)
 
     if active_loans >= settings.MAX_LOANS_PER_USER:
         raise HTTPException(
@@ -75,88 +199,285 @@ def create_loan(loan: LoanCreate, session: SessionDep):
             + " maximum)",
         )
 
-    now = datetime.now()
-    due_date = now + timedelta(days=settings.LOAN_DURATION_DAYS)
-
-    db_loan = Loan(
-        book_id=loan.book_id,
-        borrower_name=loan.borrower_name,
-        borrower_email=loan.borrower_email,
-        library_card_number=loan.library_card_number,
-        loan_date=now,
-        due_date=due_date,
-        status=LoanStatus.ACTIVE,
+    db_loan = new_loan(
+        loan.book_id,
+        loan.borrower_name,
+        loan.borrower_email,
+        loan.library_card_number,
         comments=loan.comments,
     )
 
+    record_co_borrowing(session, loan.library_card_number, loan.book_id)
     book.available_copies -= 1
 
     session.add(db_loan)
     session.add(book)
-    session.commit()
-    session.refresh(db_loan)
+    session.flush()
+    response = LoanRead.model_validate(db_loan)
+    remember_response(session, idempotency_key, "POST /loans", loan, 201, response)
 
-    return db_loan
+    return response, lambda: publish_loan_event("checkout", db_loan, book)
 
 
-@router.get("/", response_model=PaginatedResponse[LoanReadWithDetails])
-def list_loans(
-    session: SessionDep,
-    page: int = Query(1, ge=1),
-    page_size: int = Query(20, ge=1, le=100),
-    status: Optional[LoanStatus] = None,
-    borrower_email: Optional[str] = None,
-    book_id: Optional[int] = None,
-    active_only: bool = False,
-    late_only: bool = False,
+@router.post("/", response_model=LoanRead, status_code=201)
+def create_loan(
+    loan: LoanCreate, session: SessionDep, idempotency_key: IdempotencyKeyHeader = None
 ):
-    """Lister les emprunts avec filtres"""
-    statement = select(Loan, Book).join(Book, Loan.book_id == Book.id)
+    """Créer un nouvel emprunt (rejouable avec l'en-tête Idempotency-Key)"""
+    return run_idempotent_write(
+        session,
+        idempotency_key,
+        "POST /loans",
+        loan,
+        lambda write_session: apply_create_loan(write_session, loan, idempotency_key),
+    )
 
+
+def filter_loans(
+    statement,
+    model: type[Loan] | type[LoanHistory],
+    status: Optional[LoanStatus],
+    borrower_email: Optional[str],
+    book_id: Optional[int],
+    active_only: bool,
+    late_only: bool,
+):
+    """Applique les filtres de `list_loans` sur `loans` ou `loansHistory`"""
     if status:
-        statement = statement.where(Loan.status == status)
+        statement = statement.where(model.status == status)
 
     if borrower_email:
-        statement = statement.where(Loan.borrower_email.ilike(f"%{borrower_email}%"))
+        statement = statement.where(model.borrower_email.ilike(f"%{borrower_email}%"))
 
     if book_id:
-        statement = statement.where(Loan.book_id == book_id)
+        statement = statement.where(model.book_id == book_id)
 
     if active_only:
         statement = statement.where(
-            or_(Loan.status == LoanStatus.ACTIVE, Loan.status == LoanStatus.LATE)
+            or_(model.status == LoanStatus.ACTIVE, model.status == LoanStatus.LATE)
         )
 
     if late_only:
-        statement = statement.where(Loan.status == LoanStatus.LATE)
+        statement = statement.where(model.status == LoanStatus.LATE)
+
+    return statement
+
+
+def loan_columns(model: type[Loan] | type[LoanHistory], selected: list[str]) -> list:
+    """
+    Colonnes SQL nécessaires pour les champs demandés de `LoanReadWithDetails`.
+
+    `loan_date` sert au tri, et les dates de retour sont chargées dès qu'un
+    champ calculé (statut, pénalité, retard) est demandé.
+    """
+    names = {"loan_date"} | set(selected) - {"book_title", "penalty", "days_late"}
+    if {"status", "penalty", "days_late"} & set(selected):
+        names |= {"due_date", "return_date"}
+
+    columns = []
+    for name in sorted(names):
+        if name == "id" and model is LoanHistory:
+            columns.append(LoanHistory.loan_id.label("id"))
+        else:
+            columns.append(getattr(model, name).label(name))
+    if "book_title" in selected:
+        columns.append(Book.title.label("book_title"))
+    return columns
+
+
+def sparse_loan(row: dict, selected: list[str]) -> dict:
+    """Ne garde que les champs demandés d'une ligne, champs calculés inclus"""
+    item = {name: row[name] for name in selected if name in row}
+    if "status" in item:
+        item["status"] = loan_status(row["due_date"], row["return_date"])
+    if "penalty" in selected or "days_late" in selected:
+        penalty, days_late = calculate_penalty(
+            row["due_date"], row["return_date"] or datetime.now()
+        )
+        if "penalty" in selected:
+            item["penalty"] = penalty
+        if "days_late" in selected:
+            item["days_late"] = days_late
+    return item
+
 
-    statement = statement.order_by(Loan.loan_date.desc())
+def loan_details(loan: Loan | LoanHistory, book: Book) -> LoanReadWithDetails:
+    """Emprunt (courant ou archivé) avec titre, pénalité et jours de retard"""
+    update_loan_status(loan)
 
-    count_statement = select(func.count()).select_from(statement.subquery())
-    total = session.exec(count_statement).one()
+    penalty = 0.0
+    days_late = 0
+    if loan.return_date:
+        penalty, days_late = calculate_penalty(loan.due_date, loan.return_date)
+    elif loan.status == LoanStatus.LATE:
+        penalty, days_late = calculate_penalty(loan.due_date, datetime.now())
+
+    loan_dict = loan.model_dump()
+    if isinstance(loan, LoanHistory):
+        loan_dict["id"] = loan.loan_id
+    loan_dict["book_title"] = book.title
+    loan_dict["penalty"] = penalty
+    loan_dict["days_late"] = days_late
+    return LoanReadWithDetails(**loan_dict)
+
+
+def get_loans(
+    session: Session, loan_ids: list[int]
+) -> BatchResponse[LoanReadWithDetails]:
+    """Plusieurs emprunts, archivés compris, dans l'ordre demandé"""
+    loans = {
+        loan.id: loan_details(loan, book)
+        for loan, book in session.exec(
+            select(Loan, Book)
+            .join(Book, Loan.book_id == Book.id)
+            .where(Loan.id.in_(loan_ids))
+        )
+    }
+    archived_ids = [loan_id for loan_id in loan_ids if loan_id not in loans]
+    if archived_ids:
+        loans.update(
+            {
+                loan.loan_id: loan_details(loan, book)
+                for loan, book in session.exec(
+                    select(LoanHistory, Book)
+                    .join(Book, LoanHistory.book_id == Book.id)
+                    .where(LoanHistory.loan_id.in_(archived_ids))
+                )
+            }
+        )
+    session.commit()
+
+    return BatchResponse(
+        items=[loans[loan_id] for loan_id in loan_ids if loan_id in loans],
+        missing=[loan_id for loan_id in loan_ids if loan_id not in loans],
+    )
+
+
+@router.get(
+    "/",
+    response_model=PaginatedResponse[LoanReadWithDetails]
+    | BatchResponse[LoanReadWithDetails],
+)
+def list_loans(
+    session: SessionDep,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    status: Optional[LoanStatus] = None,
+    borrower_email: Optional[str] = None,
+    book_id: Optional[int] = None,
+    active_only: bool = False,
+    late_only: bool = False,
+    include_archived: bool = Query(
+        False, description="Inclure les emprunts archivés (loansHistory)"
+    ),
+    fields: Optional[str] = Query(
+        None, description="Champs à renvoyer, séparés par des virgules"
+    ),
+    ids: Optional[str] = Query(
+        None, description="Lecture groupée : identifiants séparés par des virgules"
+    ),
+):
+    """Lister les emprunts avec filtres"""
+    if ids:
+        return get_loans(session, parse_ids(ids))
 
+    filters = (status, borrower_email, book_id, active_only, late_only)
     offset = (page - 1) * page_size
-    statement = statement.offset(offset).limit(page_size)
 
-    results = session.exec(statement).all()
+    selected = parse_fields(fields, LoanReadWithDetails)
+    if selected:
+        source = filter_loans(
+            select(*loan_columns(Loan, selected)).join(Book, Loan.book_id == Book.id),
+            Loan,
+            *filters,
+        )
+        if include_archived:
+            cold = filter_loans(
+                select(*loan_columns(LoanHistory, selected)).join(
+                    Book, LoanHistory.book_id == Book.id
+                ),
+                LoanHistory,
+                *filters,
+            )
+            source = union_all(source, cold)
+        rows_source = source.subquery()
+
+        total = session.exec(select(func.count()).select_from(rows_source)).one()
+        rows = (
+            session.execute(
+                select(rows_source)
+                .order_by(rows_source.c.loan_date.desc())
+                .offset(offset)
+                .limit(page_size)
+            )
+            .mappings()
+            .all()
+        )
+        items = [sparse_loan(dict(row), selected) for row in rows]
+        return sparse_page(items, total, page, page_size)
+
+    if include_archived:
+        live = filter_loans(
+            select(Loan.id, Loan.loan_date, literal(False).label("archived")).join(
+                Book, Loan.book_id == Book.id
+            ),
+            Loan,
+            *filters,
+        )
+        cold = filter_loans(
+            select(
+                LoanHistory.id, LoanHistory.loan_date, literal(True).label("archived")
+            ).join(Book, LoanHistory.book_id == Book.id),
+            LoanHistory,
+            *filters,
+        )
+        combined = union_all(live, cold).subquery()
+
+        total = session.exec(select(func.count()).select_from(combined)).one()
+        page_rows = session.exec(
+            select(combined.c.id, combined.c.archived)
+            .order_by(combined.c.loan_date.desc())
+            .offset(offset)
+            .limit(page_size)
+        ).all()
+
+        live_ids = [row_id for row_id, archived in page_rows if not archived]
+        cold_ids = [row_id for row_id, archived in page_rows if archived]
+        rows_by_key = {
+            (False, loan.id): (loan, book)
+            for loan, book in session.exec(
+                select(Loan, Book)
+                .join(Book, Loan.book_id == Book.id)
+                .where(Loan.id.in_(live_ids))
+            ).all()
+        }
+        rows_by_key.update(
+            {
+                (True, loan.id): (loan, book)
+                for loan, book in session.exec(
+                    select(LoanHistory, Book)
+                    .join(Book, LoanHistory.book_id == Book.id)
+                    .where(LoanHistory.id.in_(cold_ids))
+                ).all()
+            }
+        )
+        results = [
+            rows_by_key[(bool(archived), row_id)] for row_id, archived in page_rows
+        ]
+    else:
+        statement = filter_loans(
+            select(Loan, Book).join(Book, Loan.book_id == Book.id), Loan, *filters
+        )
+        statement = statement.order_by(Loan.loan_date.desc())
 
-    loans_with_details = []
-    for loan, book in results:
-        update_loan_status(loan)
+        count_statement = select(func.count()).select_from(statement.subquery())
+        total = session.exec(count_statement).one()
 
-        penalty = 0.0
-        days_late = 0
-        if loan.return_date:
-            penalty, days_late = calculate_penalty(loan.due_date, loan.return_date)
-        elif loan.status == LoanStatus.LATE:
-            penalty, days_late = calculate_penalty(loan.due_date, datetime.now())
+        statement = statement.offset(offset).limit(page_size)
 
-        loan_dict = loan.model_dump()
-        loan_dict["book_title"] = book.title
-        loan_dict["penalty"] = penalty
-        loan_dict["days_late"] = days_late
-        loans_with_details.append(LoanReadWithDetails(**loan_dict))
+        results = session.exec(statement).all()
 
+    loans_with_details = [loan_details(loan, book) for loan, book in results]
     session.commit()
 
     total_pages = (total + page_size - 1) // page_size
@@ -199,8 +520,10 @@ def get_loan(loan_id: int, session: SessionDep):
     return LoanReadWithDetails(**loan_dict)
 
 
-@router.post("/{loan_id}/return", response_model=LoanReadWithDetails)
-def return_loan(loan_id: int, return_data: LoanReturn, session: SessionDep):
+def apply_return_loan(
+    session: Session, loan_id: int, return_data: LoanReturn, idempotency_key
+):
+    """Enregistre le retour sans commit ; renvoie (réponse, publications)"""
     loan = session.get(Loan, loan_id)
     if not loan:
         raise HTTPException(status_code=404, detail="Emprunt non trouvé")
@@ -222,12 +545,9 @@ def return_loan(loan_id: int, return_data: LoanReturn, session: SessionDep):
             else return_data.comments
         )
 
-    book.available_copies += 1
-
     session.add(loan)
-    session.add(book)
-    session.commit()
-    session.refresh(loan)
+    hold_loan = assign_to_next_hold(session, book)
+    session.flush()
 
     penalty, days_late = calculate_penalty(loan.due_date, return_date)
 
@@ -235,13 +555,41 @@ def return_loan(loan_id: int, return_data: LoanReturn, session: SessionDep):
     loan_dict["book_title"] = book.title
     loan_dict["penalty"] = penalty
     loan_dict["days_late"] = days_late
+    response = LoanReadWithDetails(**loan_dict)
 
-    return LoanReadWithDetails(**loan_dict)
+    scope = f"POST /loans/{loan_id}/return"
+    remember_response(session, idempotency_key, scope, return_data, 200, response)
 
+    def publish() -> None:
+        if hold_loan:
+            publish_loan_event("return", loan)
+            publish_loan_event("checkout", hold_loan, book)
+        else:
+            publish_loan_event("return", loan, book)
 
-@router.post("/{loan_id}/renew", response_model=LoanRead)
-def renew_loan(loan_id: int, session: SessionDep):
-    """Renouveler un emprunt (prolonger de 1 jours)"""
+    return response, publish
+
+
+@router.post("/{loan_id}/return", response_model=LoanReadWithDetails)
+def return_loan(
+    loan_id: int,
+    return_data: LoanReturn,
+    session: SessionDep,
+    idempotency_key: IdempotencyKeyHeader = None,
+):
+    return run_idempotent_write(
+        session,
+        idempotency_key,
+        f"POST /loans/{loan_id}/return",
+        return_data,
+        lambda write_session: apply_return_loan(
+            write_session, loan_id, return_data, idempotency_key
+        ),
+    )
+
+
+def apply_renew_loan(session: Session, loan_id: int):
+    """Prolonge l'emprunt sans commit ; renvoie (réponse, publication)"""
     loan = session.get(Loan, loan_id)
     if not loan:
         raise HTTPException(status_code=404, detail="Emprunt non trouvé")
@@ -262,7 +610,14 @@ def renew_loan(loan_id: int, session: SessionDep):
     update_loan_status(loan)
 
     session.add(loan)
-    session.commit()
-    session.refresh(loan)
+    session.flush()
 
-    return loan
+    return LoanRead.model_validate(loan), lambda: publish_loan_event("renewal", loan)
+
+
+@router.post("/{loan_id}/renew", response_model=LoanRead)
+def renew_loan(loan_id: int, session: SessionDep):
+    """Renouveler un emprunt (prolonger de 1 jours)"""
+    return run_write(
+        session, lambda write_session: apply_renew_loan(write_session, loan_id)
+    )
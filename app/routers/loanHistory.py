@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Query
+from sqlalchemy import DateTime, delete, insert, literal
+from sqlmodel import Session, select
+
+from app.core.changefeed import record_bulk_deletes
+from app.core.config import settings
+from app.core.database import SessionDep, write_engines, writer_for
+from app.models.loan import Loan, LoanStatus
+from app.models.loanHistory import LoanHistory
+from app.schemas.loan import LoanArchiveResult
+
+router = APIRouter(prefix="/loans-history", tags=["LoanHistory"])
+
+# Colonnes copiées telles quelles de `loans` vers `loansHistory`
+ARCHIVED_COLUMNS = (
+    "book_id",
+    "borrower_name",
+    "borrower_email",
+    "library_card_number",
+    "loan_date",
+    "due_date",
+    "return_date",
+    "status",
+    "comments",
+    "renewed",
+)
+
+
+def archive_returned_loans(
+    session: Session, older_than_days: Optional[int] = None
+) -> tuple[int, datetime]:
+    """
+    Déplace les emprunts retournés depuis plus de N jours vers l'archive.
+
+    Le déplacement se fait par lots de `ARCHIVE_BATCH_SIZE` emprunts, un lot
+    par transaction, pour ne pas garder le verrou d'écriture SQLite trop longtemps.
+
+    Args:
+        session: Session de base de données
+        older_than_days: Âge minimal du retour (défaut : `ARCHIVE_AFTER_DAYS`)
+
+    Returns:
+        Tuple (nombre d'emprunts archivés, date limite utilisée)
+    """
+    if older_than_days is None:
+        older_than_days = settings.ARCHIVE_AFTER_DAYS
+    now = datetime.now()
+    cutoff = now - timedelta(days=older_than_days)
+
+    archived = 0
+    while True:
+        loan_ids = session.exec(
+            select(Loan.id)
+            .where(Loan.status == LoanStatus.RETURNED, Loan.return_date < cutoff)
+            .order_by(Loan.id)
+            .limit(settings.ARCHIVE_BATCH_SIZE)
+        ).all()
+        if not loan_ids:
+            break
+
+        source = select(
+            Loan.id,
+            *(getattr(Loan, column) for column in ARCHIVED_COLUMNS),
+            literal(now, type_=DateTime),
+        ).where(Loan.id.in_(loan_ids))
+        session.execute(
+            insert(LoanHistory).from_select(
+                ["loan_id", *ARCHIVED_COLUMNS, "archived_at"], source
+            )
+        )
+        session.execute(delete(Loan).where(Loan.id.in_(loan_ids)))
+        # Pour le flux de modifications, un emprunt archivé quitte `loans`
+        record_bulk_deletes(session, Loan, loan_ids)
+        session.commit()
+        archived += len(loan_ids)
+
+    return archived, cutoff
+
+
+def run_archive_job() -> int:
+    """Exécute un archivage complet avec sa propre session"""
+    archived = 0
+    for bind in write_engines().values():
+        with Session(bind) as session:
+            archived += archive_returned_loans(session)[0]
+    return archived
+
+
+@router.post("/archive", response_model=LoanArchiveResult)
+def archive_loans(
+    session: SessionDep,
+    older_than_days: Optional[int] = Query(
+        None, ge=0, description="Âge minimal du retour en jours"
+    ),
+):
+    """Archiver les emprunts retournés depuis plus de N jours"""
+    with Session(writer_for(session.bind)) as write_session:
+        archived, cutoff = archive_returned_loans(write_session, older_than_days)
+    return LoanArchiveResult(archived=archived, cutoff=cutoff)
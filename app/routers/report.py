@@ -0,0 +1,72 @@
+from datetime import datetime
+
+from fastapi import APIRouter, Query
+from sqlmodel import func, select
+
+from app.core.reporting import ReportingSessionDep
+from app.models.book import Book
+from app.models.hold import Hold, HoldStatus
+from app.models.loan import Loan
+from app.models.loanHistory import LoanHistory
+from app.routers.loan import loan_details
+from app.schemas.common import PaginatedResponse
+from app.schemas.loan import LoanReadWithDetails
+from app.schemas.report import CirculationReport
+
+router = APIRouter(prefix="/reports", tags=["Reports"])
+
+
+@router.get("/late-loans", response_model=PaginatedResponse[LoanReadWithDetails])
+def list_late_loans(
+    session: ReportingSessionDep,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+):
+    """Emprunts non rendus dont l'échéance est passée, du plus ancien retard"""
+    late = (
+        select(Loan, Book)
+        .join(Book, Loan.book_id == Book.id)
+        .where(Loan.return_date.is_(None), Loan.due_date < datetime.now())
+    )
+    total = session.exec(select(func.count()).select_from(late.subquery())).one()
+    rows = session.exec(
+        late.order_by(Loan.due_date).offset((page - 1) * page_size).limit(page_size)
+    ).all()
+
+    return PaginatedResponse(
+        items=[loan_details(loan, book) for loan, book in rows],
+        total=total,
+        page=page,
+        page_size=page_size,
+        total_pages=(total + page_size - 1) // page_size,
+    )
+
+
+@router.get("/circulation", response_model=CirculationReport)
+def get_circulation_report(session: ReportingSessionDep):
+    """Exemplaires, emprunts en cours, retards, archives et réservations"""
+    books, total_copies, available_copies = session.exec(
+        select(
+            func.count(),
+            func.coalesce(func.sum(Book.total_copies), 0),
+            func.coalesce(func.sum(Book.available_copies), 0),
+        )
+    ).one()
+    active_loans, late_loans = session.exec(
+        select(
+            func.count(),
+            func.count().filter(Loan.due_date < datetime.now()),
+        ).where(Loan.return_date.is_(None))
+    ).one()
+
+    return CirculationReport(
+        books=books,
+        total_copies=total_copies,
+        available_copies=available_copies,
+        active_loans=active_loans,
+        late_loans=late_loans,
+        archived_loans=session.exec(select(func.count(LoanHistory.id))).one(),
+        waiting_holds=session.exec(
+            select(func.count()).where(Hold.status == HoldStatus.WAITING)
+        ).one(),
+    )
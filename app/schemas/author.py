@@ -3,6 +3,7 @@ from typing import Optional
 
 from pydantic import BaseModel, field_validator
 
+from app.schemas.book import BookRead
 from app.schemas.validators import validate_birth_date
 
 
@@ -76,3 +77,6 @@ class AuthorWithBooks(AuthorRead):
     """Schema pour lire un auteur avec ses livres"""
 
     books_count: int = 0
+    # Présents seulement si demandés avec `include=books,loans_count`
+    books: Optional[list[BookRead]] = None
+    loans_count: Optional[int] = None
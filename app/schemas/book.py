@@ -3,6 +3,7 @@ from typing import Optional
 from pydantic import BaseModel, field_validator, model_validator
 
 from app.models.book import BookCategory
+from app.schemas.common import PaginatedResponse
 from app.schemas.validators import (
     validate_available_copies,
     validate_isbn13,
@@ -117,3 +118,18 @@ class BookRead(BookBase):
 class BookReadWithAuthor(BookRead):
     author_name: str = ""
     loans_count: int = 0
+
+
+# livre trouvé par la recherche dans toutes les succursales
+class BranchBookRead(BookReadWithAuthor):
+    branch: str
+
+
+# livre « aussi emprunté » avec le nombre de lecteurs en commun
+class RelatedBookRead(BookRead):
+    co_loans: int = 0
+
+
+# réponse de search_books, avec les comptes par facette si demandés
+class BookSearchResponse(PaginatedResponse[BookReadWithAuthor]):
+    facets: Optional[dict[str, dict[str, int]]] = None
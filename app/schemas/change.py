@@ -0,0 +1,32 @@
+from datetime import datetime
+from typing import Any, Optional
+
+from pydantic import BaseModel
+
+
+class ChangeRead(BaseModel):
+    """Schema pour une entrée du journal des modifications"""
+
+    id: int
+    entity: str
+    entity_id: int
+    operation: str
+    changed_at: datetime
+    payload: Optional[dict[str, Any]] = None
+
+    class Config:
+        from_attributes = True
+
+
+class ChangeFeedResponse(BaseModel):
+    """Schema pour une page du flux de modifications"""
+
+    changes: list[ChangeRead]
+    next_token: int
+    has_more: bool
+
+
+class ChangeTokenResponse(BaseModel):
+    """Schema pour le jeton courant du flux (point de départ après un export)"""
+
+    next_token: int
@@ -1,4 +1,4 @@
-from typing import Generic, Optional, TypeVar
+from typing import Generic, Literal, Optional, TypeVar
 
 from pydantic import BaseModel
 
@@ -15,6 +15,13 @@ class PaginatedResponse(BaseModel, Generic[T]):
     total_pages: int
 
 
+class BatchResponse(BaseModel, Generic[T]):
+    """Schema pour une lecture groupée par liste d'identifiants (`ids=`)"""
+
+    items: list[T]
+    missing: list[int]
+
+
 class MessageResponse(BaseModel):
     """Schema pour les réponses avec message simple"""
 
@@ -50,3 +57,11 @@ class AuthorStatsResponse(BaseModel):
     author_name: str
     total_books: int
     total_loans: int
+
+
+class AutocompleteSuggestion(BaseModel):
+    """Schema pour une suggestion d'autocomplétion"""
+
+    kind: Literal["book", "author"]
+    id: int
+    label: str
@@ -0,0 +1,42 @@
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel, EmailStr, field_validator
+
+from app.models.hold import HoldStatus
+
+
+class HoldCreate(BaseModel):
+    """Schema pour réserver un livre indisponible"""
+
+    borrower_name: str
+    borrower_email: EmailStr
+    library_card_number: str
+
+    @field_validator("library_card_number")
+    @classmethod
+    def validate_card_number(cls, v: str) -> str:
+        """Valide le numéro de carte de bibliothèque"""
+        if not v or len(v) < 5:
+            raise ValueError(
+                "Le numéro de carte de bibliothèque doit contenir au moins 5 caractères"
+            )
+        return v
+
+
+class HoldRead(BaseModel):
+    """Schema pour lire une réservation"""
+
+    id: int
+    book_id: int
+    borrower_name: str
+    borrower_email: EmailStr
+    library_card_number: str
+    created_at: datetime
+    status: HoldStatus
+    loan_id: Optional[int] = None
+    fulfilled_at: Optional[datetime] = None
+    position: Optional[int] = None
+
+    class Config:
+        from_attributes = True
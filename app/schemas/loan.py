@@ -65,3 +65,10 @@ class LoanReadWithDetails(LoanRead):
     book_title: str = ""
     penalty: float = 0.0
     days_late: int = 0
+
+
+class LoanArchiveResult(BaseModel):
+    """Schema pour le résultat d'un archivage d'emprunts"""
+
+    archived: int
+    cutoff: datetime
@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+
+
+class CirculationReport(BaseModel):
+    """Schema pour l'état global de la circulation"""
+
+    books: int
+    total_copies: int
+    available_copies: int
+    active_loans: int
+    late_loans: int
+    archived_loans: int
+    waiting_holds: int
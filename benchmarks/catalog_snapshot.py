@@ -0,0 +1,79 @@
+"""
+Temps de filtrage du catalogue en colonnes sur un grand nombre de titres.
+
+Le catalogue est rempli de livres synthétiques (sans base de données) puis
+chaque filtre est évalué plusieurs fois comme le fait une recherche paginée :
+masque, total et identifiants de la première page. NumPy est utilisé s'il est
+installé.
+
+Usage :
+    python -m benchmarks.catalog_snapshot [--books 1000000] [--runs 20]
+        [--page-size 20]
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from app.core.catalog import BookCatalog, numpy
+from app.models.book import BookCategory
+
+LANGUAGES = ["fr", "en", "de", "es", "it", "pt", "nl", "ja"]
+
+FILTERS = {
+    "année exacte": {"year_min": 1900, "year_max": 1900},
+    "décennie": {"year_min": 1950, "year_max": 1959},
+    "catégorie + disponibles": {
+        "category": BookCategory.FICTION,
+        "available_only": True,
+    },
+    "langue": {"language": "de"},
+    "langue + années + catégorie": {
+        "language": "fr",
+        "year_min": 1800,
+        "year_max": 1850,
+        "category": BookCategory.HISTOIRE,
+    },
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--page-size", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    categories = list(BookCategory)
+    catalog = BookCatalog()
+    t0 = time.perf_counter()
+    catalog.load(
+        (
+            book_id,
+            rng.randint(1450, 2025),
+            rng.choice(categories),
+            rng.choice(LANGUAGES),
+            rng.randint(0, 3),
+            rng.randint(1, 50_000),
+        )
+        for book_id in range(1, args.books + 1)
+    )
+    load_s = time.perf_counter() - t0
+
+    backend = "numpy" if numpy is not None else "python"
+    print(f"{args.books} livres chargés en {load_s:.1f} s (filtres : {backend})")
+    for name, filters in FILTERS.items():
+        samples = []
+        for _ in range(args.runs):
+            t0 = time.perf_counter()
+            matched = catalog.match(**filters)
+            matched.page(0, args.page_size)
+            samples.append(time.perf_counter() - t0)
+        median_ms = statistics.median(samples) * 1000
+        print(f"  {name:<30} {median_ms:8.3f} ms  {len(matched):>8} livres")
+
+
+if __name__ == "__main__":
+    main()
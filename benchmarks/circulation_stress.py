@@ -0,0 +1,299 @@
+"""
+Stress des emprunts, retours et renouvellements, puis contrôle des invariants.
+
+Plusieurs processus (autant de workers Uvicorn), chacun avec plusieurs
+threads clients, enchaînent au hasard emprunts, retours et renouvellements sur
+une même base fichier ; une part des emprunts est rejouée avec la même
+Idempotency-Key. Un emprunt refusé faute d'exemplaire devient, pour une part
+`--hold-share`, une réservation : les retours l'attribuent, et le client
+reprend ensuite les emprunts ainsi créés pour les rendre à leur tour. À la
+fin, la base est vérifiée :
+
+- 0 <= available_copies <= total_copies pour chaque livre ;
+- available_copies + emprunts en cours == total_copies ;
+- aucun lecteur au-delà de MAX_LOANS_PER_USER emprunts en cours ;
+- une réservation attribuée pointe vers un emprunt du même livre et lecteur ;
+- un emprunt réussi, rejoué avec sa clé, renvoie le même emprunt.
+
+Le débit et les réponses par opération sont affichés ; le code de sortie vaut 1
+si un invariant est violé ou si une réponse 5xx a été reçue.
+
+Usage :
+    python -m benchmarks.circulation_stress [--processes 4] [--threads 8]
+        [--ops 200] [--books 20] [--copies 3] [--borrowers 30]
+        [--idempotent-share 0.2] [--hold-share 0.5] [--max-loans 2]
+        [--batching]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+
+IDEMPOTENCY_VIOLATION = "emprunt rejoué exécuté deux fois"
+
+
+def borrower(n: int) -> dict[str, str]:
+    return {
+        "borrower_name": f"Lecteur {n}",
+        "borrower_email": f"lecteur{n}@example.com",
+        "library_card_number": f"CARD-{n:04d}",
+    }
+
+
+def seed(client, books: int, copies: int) -> None:
+    author = client.post(
+        "/authors/",
+        json={
+            "first_name": "Victor",
+            "last_name": "Hugo",
+            "birth_date": "1802-02-26",
+            "nationality": "fr",
+        },
+    ).json()
+    for n in range(books):
+        base = f"978{n:09d}"
+        checksum = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(base))
+        response = client.post(
+            "/books/",
+            json={
+                "title": f"Livre {n}",
+                "isbn": base + str((10 - checksum % 10) % 10),
+                "publication_year": 1850 + n % 170,
+                "author_id": author["id"],
+                "available_copies": copies,
+                "total_copies": copies,
+                "language": "fr",
+                "pages": 300,
+                "publisher": "Gallimard",
+            },
+        )
+        assert response.status_code == 201, response.text
+
+
+def client_loop(client, args, rng: random.Random, outcomes: Counter) -> None:
+    """
+    Un client : opérations au hasard sur ses propres emprunts en cours et
+    réservations. `outcomes` est propre au thread (fusionné après coup).
+    """
+    mine: list[int] = []
+    # (livre, lecteur) des réservations posées, dont l'emprunt reste à reprendre
+    holds: list[tuple[int, int]] = []
+    for _ in range(args.ops):
+        draw = rng.random()
+        if draw < 0.5 or not (mine or holds):
+            reader = rng.randrange(args.borrowers)
+            body = {"book_id": rng.randint(1, args.books), **borrower(reader)}
+            headers = {}
+            if rng.random() < args.idempotent_share:
+                headers["Idempotency-Key"] = uuid.uuid4().hex
+            response = client.post("/loans/", json=body, headers=headers)
+            outcomes[f"emprunt {response.status_code}"] += 1
+            if response.status_code == 201:
+                mine.append(response.json()["id"])
+            elif (
+                response.status_code == 400
+                and "pas disponible" in response.json()["detail"]
+                and rng.random() < args.hold_share
+            ):
+                hold = client.post(
+                    f"/books/{body['book_id']}/holds", json=borrower(reader)
+                )
+                outcomes[f"réservation {hold.status_code}"] += 1
+                if hold.status_code == 201:
+                    holds.append((body["book_id"], reader))
+            if headers:
+                # Même clé : un emprunt réussi doit être rejoué à l'identique,
+                # un refus est simplement retenté
+                retry = client.post("/loans/", json=body, headers=headers)
+                if response.status_code != 201:
+                    outcomes[f"emprunt retenté {retry.status_code}"] += 1
+                    if retry.status_code == 201:
+                        mine.append(retry.json()["id"])
+                elif (
+                    retry.headers.get("Idempotent-Replayed") == "true"
+                    and retry.json()["id"] == response.json()["id"]
+                ):
+                    outcomes[f"emprunt rejoué {retry.status_code}"] += 1
+                else:
+                    outcomes[IDEMPOTENCY_VIOLATION] += 1
+        elif draw < 0.75 and mine:
+            loan_id = mine.pop(rng.randrange(len(mine)))
+            response = client.post(f"/loans/{loan_id}/return", json={})
+            outcomes[f"retour {response.status_code}"] += 1
+        elif draw < 0.9 and holds or not mine:
+            # Emprunt créé par l'attribution d'une réservation, à reprendre
+            book_id, reader = holds.pop(rng.randrange(len(holds)))
+            response = client.get(
+                "/loans/",
+                params={
+                    "borrower_email": borrower(reader)["borrower_email"],
+                    "book_id": book_id,
+                    "active_only": True,
+                },
+            )
+            outcomes[f"reprise {response.status_code}"] += 1
+            adopted = [
+                loan["id"]
+                for loan in response.json().get("items", [])
+                if loan["id"] not in mine
+            ]
+            if adopted:
+                mine.extend(adopted)
+            else:
+                # Réservation pas encore attribuée : reprise plus tard
+                holds.append((book_id, reader))
+        else:
+            loan_id = rng.choice(mine)
+            response = client.post(f"/loans/{loan_id}/renew")
+            outcomes[f"renouvellement {response.status_code}"] += 1
+
+
+def worker(args: argparse.Namespace, worker_id: int) -> tuple[Counter, float]:
+    """Un processus : une application, `threads` clients concurrents"""
+    os.environ["SCHEMA_MODE"] = "verify"
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    per_thread = [Counter() for _ in range(args.threads)]
+    with TestClient(app) as client:
+        threads = [
+            threading.Thread(
+                target=client_loop,
+                args=(
+                    client,
+                    args,
+                    random.Random(worker_id * 1000 + n),
+                    per_thread[n],
+                ),
+            )
+            for n in range(args.threads)
+        ]
+        t0 = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - t0
+    return sum(per_thread, Counter()), elapsed
+
+
+def check_invariants(path: str, max_loans: int) -> list[str]:
+    """Violations trouvées dans la base après le stress"""
+    violations = []
+    with sqlite3.connect(path) as connection:
+        active = dict(
+            connection.execute(
+                "SELECT book_id, COUNT(*) FROM loans WHERE return_date IS NULL"
+                " GROUP BY book_id"
+            )
+        )
+        for book_id, available, total in connection.execute(
+            "SELECT id, available_copies, total_copies FROM books"
+        ):
+            if not 0 <= available <= total:
+                violations.append(
+                    f"livre {book_id} : {available} disponibles pour {total}"
+                )
+            if available + active.get(book_id, 0) != total:
+                violations.append(
+                    f"livre {book_id} : {available} disponibles"
+                    f" + {active.get(book_id, 0)} en cours != {total}"
+                )
+        for email, count in connection.execute(
+            "SELECT borrower_email, COUNT(*) FROM loans WHERE return_date IS NULL"
+            " GROUP BY borrower_email HAVING COUNT(*) > ?",
+            (max_loans,),
+        ):
+            violations.append(f"{email} : {count} emprunts en cours > {max_loans}")
+        for hold_id, loan_id in connection.execute(
+            "SELECT holds.id, holds.loan_id FROM holds"
+            " LEFT JOIN loans ON loans.id = holds.loan_id"
+            " AND loans.book_id = holds.book_id"
+            " AND loans.borrower_email = holds.borrower_email"
+            " WHERE holds.status = 'FULFILLED' AND loans.id IS NULL"
+        ):
+            violations.append(
+                f"réservation {hold_id} attribuée à l'emprunt {loan_id} introuvable"
+            )
+    return violations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=200)
+    parser.add_argument("--books", type=int, default=20)
+    parser.add_argument("--copies", type=int, default=3)
+    parser.add_argument("--borrowers", type=int, default=30)
+    parser.add_argument("--idempotent-share", type=float, default=0.2)
+    parser.add_argument("--hold-share", type=float, default=0.5)
+    # Limite basse : des lecteurs l'atteignent, réservations comprises
+    parser.add_argument("--max-loans", type=int, default=2)
+    parser.add_argument("--batching", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = f"{tmp}/stress.db"
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+        os.environ["ADMISSION_ENABLED"] = "false"
+        os.environ["LOG_LEVEL"] = "WARNING"
+        os.environ["MAX_LOANS_PER_USER"] = str(args.max_loans)
+        os.environ["WRITE_BATCHING_ENABLED"] = str(args.batching).lower()
+
+        from fastapi.testclient import TestClient
+
+        from app.core.config import settings
+        from app.main import app
+
+        with TestClient(app) as client:
+            seed(client, args.books, args.copies)
+
+        # Interpréteurs neufs, comme des workers : aucun état en mémoire partagé
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(args.processes) as pool:
+            results = pool.starmap(
+                worker, [(args, worker_id) for worker_id in range(args.processes)]
+            )
+
+        outcomes: Counter = Counter()
+        for worker_outcomes, _ in results:
+            outcomes.update(worker_outcomes)
+        requests = sum(outcomes.values())
+        elapsed = max(elapsed for _, elapsed in results)
+        violations = check_invariants(path, settings.MAX_LOANS_PER_USER)
+        if outcomes[IDEMPOTENCY_VIOLATION]:
+            violations.append(
+                f"{outcomes[IDEMPOTENCY_VIOLATION]} emprunt(s) rejoué(s) exécuté(s)"
+                " une seconde fois"
+            )
+
+    clients = args.processes * args.threads
+    print(
+        f"{requests} requêtes, {clients} clients ({args.processes} processus),"
+        f" {elapsed:.1f} s : {requests / elapsed:.0f} requêtes/s"
+    )
+    for outcome, count in sorted(outcomes.items()):
+        print(f"  {outcome:<35} {count:>7}")
+    server_errors = sum(
+        count for outcome, count in outcomes.items() if re.search(r" 5\d\d\b", outcome)
+    )
+    if violations or server_errors:
+        print(f"{len(violations)} violation(s), {server_errors} réponse(s) 5xx")
+        for violation in violations:
+            print(f"  {violation}")
+        raise SystemExit(1)
+    print("Invariants respectés")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Débit des emprunts avec et sans regroupement des commits.
+
+Chaque mode tourne dans un interpréteur neuf sur une base fichier neuve, avec
+les réglages d'admission par défaut (hors débit par client) : des threads
+clients enchaînent des emprunts et l'on compte les emprunts validés par
+seconde.
+
+Usage :
+    python -m benchmarks.group_commit [--clients 16] [--loans 50]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+PROBE = """
+import json, sys, threading, time
+from fastapi.testclient import TestClient
+from app.main import app
+
+clients, loans = int(sys.argv[1]), int(sys.argv[2])
+with TestClient(app) as client:
+    author = client.post("/authors/", json={
+        "first_name": "Victor", "last_name": "Hugo", "birth_date": "1802-02-26",
+        "nationality": "fr",
+    }).json()
+    copies = clients * loans
+    book = client.post("/books/", json={
+        "title": "Les Misérables", "isbn": "9782070409228",
+        "publication_year": 1862, "author_id": author["id"],
+        "available_copies": copies, "total_copies": copies,
+        "language": "fr", "pages": 1500, "publisher": "Gallimard",
+    }).json()
+
+    def borrow(worker):
+        for n in range(loans):
+            response = client.post("/loans/", json={
+                "book_id": book["id"], "borrower_name": "Lecteur",
+                "borrower_email": f"lecteur{worker}-{n}@example.com",
+                "library_card_number": f"CARD-{worker:04d}-{n:04d}",
+            })
+            assert response.status_code == 201, response.text
+
+    threads = [threading.Thread(target=borrow, args=(w,)) for w in range(clients)]
+    t0 = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - t0
+    metrics = client.get("/admin/metrics").json()["group_commit"]
+print(json.dumps({"loans_per_s": clients * loans / elapsed, **metrics}))
+"""
+
+
+def run_probe(env: dict[str, str], clients: int, loans: int) -> dict[str, float]:
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE, str(clients), str(loans)],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--loans", type=int, default=50)
+    args = parser.parse_args()
+
+    for batching in ("false", "true"):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {
+                **os.environ,
+                "DATABASE_URL": f"sqlite:///{tmp}/bench.db",
+                # Admission par défaut (porte des écritures comprise) ; seul le
+                # débit par client est relevé, tous les threads partageant une IP
+                "WRITE_RATE_PER_SECOND": "1000000",
+                "WRITE_BURST": "1000000",
+                "MAX_LOANS_PER_USER": str(args.loans),
+                "WRITE_BATCHING_ENABLED": batching,
+            }
+            result = run_probe(env, args.clients, args.loans)
+        print(f"WRITE_BATCHING_ENABLED={batching} ({args.clients} clients)")
+        print(f"  emprunts/s  {result['loans_per_s']:8.1f}")
+        if result["batches"]:
+            print(f"  taille moyenne des lots {result['jobs'] / result['batches']:.1f}")
+
+
+if __name__ == "__main__":
+    main()
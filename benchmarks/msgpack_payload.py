@@ -0,0 +1,126 @@
+"""
+Taille et coût d'encodage des réponses JSON et MessagePack.
+
+Remplit une base temporaire, récupère une page de `list_loans` et de
+`search_books` dans les deux formats, puis mesure la taille des corps et le
+temps d'encodage (serveur) et de décodage (client) de chacun.
+
+Usage :
+    python -m benchmarks.msgpack_payload [--books 200] [--repeat 2000]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import timeit
+
+PAGES = {
+    "list_loans": "/loans/?page_size=100",
+    "search_books": "/books/search?page_size=100",
+}
+
+
+def seed(client, books: int) -> None:
+    author = client.post(
+        "/authors/",
+        json={
+            "first_name": "Victor",
+            "last_name": "Hugo",
+            "birth_date": "1802-02-26",
+            "nationality": "fr",
+        },
+    ).json()
+    for n in range(books):
+        base = f"978{n:09d}"
+        checksum = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(base))
+        book = client.post(
+            "/books/",
+            json={
+                "title": f"Livre {n}",
+                "isbn": base + str((10 - checksum % 10) % 10),
+                "publication_year": 1850 + n % 170,
+                "author_id": author["id"],
+                "available_copies": 1,
+                "total_copies": 1,
+                "language": "fr",
+                "pages": 300,
+                "publisher": "Gallimard",
+                "description": "Roman du XIXe siècle",
+            },
+        ).json()
+        client.post(
+            "/loans/",
+            json={
+                "book_id": book["id"],
+                "borrower_name": "Lecteur",
+                "borrower_email": f"lecteur{n}@example.com",
+                "library_card_number": f"CARD-{n:05d}",
+            },
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/bench.db"
+        os.environ["ADMISSION_ENABLED"] = "false"
+        os.environ["MAX_LOANS_PER_USER"] = str(args.books)
+
+        import msgpack
+        from fastapi.testclient import TestClient
+
+        from app.core.negotiation import NegotiatedResponse
+        from app.main import app
+
+        with TestClient(app) as client:
+            seed(client, args.books)
+            for name, url in PAGES.items():
+                as_json = client.get(url, headers={"Accept-Encoding": "identity"})
+                as_msgpack = client.get(
+                    url,
+                    headers={
+                        "Accept": "application/msgpack",
+                        "Accept-Encoding": "identity",
+                    },
+                )
+                content = as_json.json()
+                assert msgpack.unpackb(as_msgpack.content) == content
+
+                render = NegotiatedResponse(content).render
+                encode_json = timeit.timeit(lambda: render(content), number=args.repeat)
+                encode_msgpack = timeit.timeit(
+                    lambda: msgpack.packb(content), number=args.repeat
+                )
+                decode_json = timeit.timeit(
+                    lambda: json.loads(as_json.content), number=args.repeat
+                )
+                decode_msgpack = timeit.timeit(
+                    lambda: msgpack.unpackb(as_msgpack.content), number=args.repeat
+                )
+
+                print(f"{name} ({len(content['items'])} éléments)")
+                print(
+                    f"  {'':<10} {'octets':>8} {'encodage µs':>12} {'décodage µs':>12}"
+                )
+                for label, size, encode, decode in (
+                    ("json", len(as_json.content), encode_json, decode_json),
+                    (
+                        "msgpack",
+                        len(as_msgpack.content),
+                        encode_msgpack,
+                        decode_msgpack,
+                    ),
+                ):
+                    print(
+                        f"  {label:<10} {size:>8} {encode / args.repeat * 1e6:>12.1f}"
+                        f" {decode / args.repeat * 1e6:>12.1f}"
+                    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Mesure du démarrage à froid de l'API.
+
+Chaque mesure est faite dans un interpréteur neuf pour que le cache des
+modules ne fausse pas le temps d'import.
+
+Usage :
+    python -m benchmarks.startup [--runs 5]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PROBE = """
+import json, time
+t0 = time.perf_counter()
+import app.main
+t1 = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(app.main.app) as client:
+    t2 = time.perf_counter()
+    client.get("/health")
+    t3 = time.perf_counter()
+    client.get("/books/search")
+    t4 = time.perf_counter()
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "startup_ms": (t2 - t1) * 1000,
+    "first_request_ms": (t3 - t2) * 1000,
+    "first_query_ms": (t4 - t3) * 1000,
+}))
+"""
+
+
+def run_probe(env: dict[str, str]) -> dict[str, float]:
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, "DATABASE_URL": f"sqlite:///{tmp}/bench.db"}
+        subprocess.run([sys.executable, "-m", "app.core.database"], env=env, check=True)
+
+        for mode in ("create", "verify"):
+            samples = [
+                run_probe({**env, "SCHEMA_MODE": mode}) for _ in range(args.runs)
+            ]
+            print(f"SCHEMA_MODE={mode} ({args.runs} runs, médiane)")
+            for key in samples[0]:
+                value = statistics.median(sample[key] for sample in samples)
+                print(f"  {key:<18} {value:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""Stress de circulation en petite configuration (`pytest -m slow`)"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("batching", [False, True], ids=["direct", "batching"])
+def test_circulation_invariants(batching: bool) -> None:
+    """Emprunts, retours, réservations concurrents : invariants respectés"""
+    # Un interpréteur par exécution : la configuration est lue à l'import
+    command = [
+        sys.executable,
+        "-m",
+        "benchmarks.circulation_stress",
+        "--processes",
+        "2",
+        "--threads",
+        "3",
+        "--ops",
+        "40",
+        "--books",
+        "4",
+        "--copies",
+        "2",
+        "--borrowers",
+        "8",
+    ]
+    if batching:
+        command.append("--batching")
+    result = subprocess.run(
+        command, cwd=ROOT, capture_output=True, text=True, timeout=300
+    )
+    assert result.returncode == 0, result.stdout + result.stderr[-2000:]
+    assert "Invariants respectés" in result.stdout